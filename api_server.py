@@ -1,23 +1,40 @@
-from fastapi import FastAPI, UploadFile, File, HTTPException, Query
+from startup import MODULES_IMPORT_STARTED, Preloader
+
+from fastapi import FastAPI, UploadFile, File, HTTPException, Query, Request, Header, Depends
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import StreamingResponse
-from pydantic import BaseModel
+from fastapi.responses import StreamingResponse, JSONResponse, PlainTextResponse
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+from starlette.datastructures import Headers, MutableHeaders
+from pydantic import BaseModel, Field
 import os
 import json
-import shutil
-from typing import List, Dict, Optional, AsyncGenerator
+import hmac
+import time
+from typing import List, Dict, Optional, AsyncGenerator, TYPE_CHECKING
 import uvicorn
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 
-from langchain_community.document_loaders import PyMuPDFLoader
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_huggingface import HuggingFaceEmbeddings
-from langchain_community.vectorstores import FAISS
-from langchain.chains import RetrievalQA
-from langchain.memory import ConversationBufferMemory
-from langchain.schema import HumanMessage, AIMessage
+from summarizer import is_summary_request, summarize_document
+from retrieval_cache import LRUCache
+from chunked_upload import ResumableUploads, UploadError
+from artifact_store import ArtifactStore, derived_key, file_sha256
+from residency import TieredVectorStores
+from indexing import (
+    CHUNK_SIZE, CHUNK_OVERLAP, EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND,
+    build_vector_store, get_embedding_model, load_retrieval_settings,
+)
+from serialization import json_response, sse_event, coalesce_chunks
+from profiling import (
+    RequestProfile, ProfileStore, MemorySnapshots,
+    begin_profile, end_profile, profile_stage, profile_iterator,
+)
 
-from custom_langchain import MyDualEndpointLLM as LLM
+# langchain, FAISS and torch are imported lazily (see startup.py) so the server
+# can answer liveness probes before they finish loading
+if TYPE_CHECKING:
+    from langchain_community.vectorstores import FAISS
+    from custom_langchain import MyDualEndpointLLM as LLM
 
 # Initialize FastAPI app
 app = FastAPI(title="Agentic PDF Chatbot Backend", version="1.0.0")
@@ -31,14 +48,126 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+class ProfileRequestMiddleware:
+    """
+    Capture a sampling profile of requests sent with 'X-Profile: 1' and a valid admin token.
+    Plain ASGI, so requests without the header pass straight through, streamed bodies included.
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        headers = Headers(scope=scope)
+        if headers.get("x-profile") != "1":
+            await self.app(scope, receive, send)
+            return
+        if not is_admin_token(headers.get("x-admin-token")):
+            await JSONResponse(status_code=403, content={"detail": "Invalid admin token."})(scope, receive, send)
+            return
+
+        profile = RequestProfile(f"{scope['method']} {scope['path']}")
+        profile_store.add(profile)
+
+        async def send_with_profile_id(message):
+            if message["type"] == "http.response.start":
+                MutableHeaders(scope=message)["X-Profile-Id"] = profile.id
+            await send(message)
+
+        token = begin_profile(profile)
+        try:
+            # Returns once the last body chunk is sent, so streamed responses are covered
+            await self.app(scope, receive, send_with_profile_id)
+        finally:
+            profile.stop()
+            end_profile(token)
+
+
+app.add_middleware(ProfileRequestMiddleware)
+
 # Globals for storing uploaded files and vector DBs, sessions
 uploaded_files: Dict[str, Dict] = {}
-vector_stores: Dict[str, FAISS] = {}
+# Only recently used indexes stay in memory; others are reloaded from the artifact store on access
+VECTOR_STORE_MEMORY_BUDGET_BYTES = int(os.environ.get("VECTOR_STORE_MEMORY_BUDGET_BYTES", str(1024 * 1024 * 1024)))
+vector_stores = TieredVectorStores(
+    VECTOR_STORE_MEMORY_BUDGET_BYTES,
+    loader=lambda filename: load_vector_store(filename),
+    can_demote=lambda filename: filename in uploaded_files,
+)
 chat_sessions: Dict[str, Dict] = {}
+document_summaries: Dict[str, Dict] = {}
+# Bumped on every upload/delete so cached retrieval results of older content are never served
+document_versions: Dict[str, int] = {}
 
 TMP_FOLDER = "./tmp_uploads"
 os.makedirs(TMP_FOLDER, exist_ok=True)
 
+# Resumable uploads are written part by part to disk, so they can be much larger than /upload
+MAX_RESUMABLE_UPLOAD_SIZE = int(os.environ.get("MAX_RESUMABLE_UPLOAD_SIZE", str(512 * 1024 * 1024)))
+RESUMABLE_PART_SIZE = 8 * 1024 * 1024
+# Unfinished uploads idle for longer than this are deleted
+RESUMABLE_UPLOAD_TTL_SECONDS = int(os.environ.get("RESUMABLE_UPLOAD_TTL_SECONDS", str(24 * 60 * 60)))
+resumable_uploads = ResumableUploads(
+    os.path.join(TMP_FOLDER, "resumable"), MAX_RESUMABLE_UPLOAD_SIZE, RESUMABLE_UPLOAD_TTL_SECONDS
+)
+
+# PDFs, FAISS indexes and summaries are kept in a content-addressed store under a disk budget
+ARTIFACT_STORE_DIR = os.environ.get("ARTIFACT_STORE_DIR", "./artifact_store")
+ARTIFACT_STORE_BUDGET_BYTES = int(os.environ.get("ARTIFACT_STORE_BUDGET_BYTES", str(2 * 1024 * 1024 * 1024)))
+artifact_store = ArtifactStore(ARTIFACT_STORE_DIR, ARTIFACT_STORE_BUDGET_BYTES)
+
+CHAT_K = 3
+ASK_K = 5
+
+# Background summaries cost one LLM call per ~4000 characters, so they are opt-in per upload
+# (summarize=true) unless enabled for every upload here
+SUMMARIZE_ON_UPLOAD = os.environ.get("SUMMARIZE_ON_UPLOAD", "0") == "1"
+# Concurrent summary LLM calls across all documents
+SUMMARY_MAX_CONCURRENCY = int(os.environ.get("SUMMARY_MAX_CONCURRENCY", "4"))
+# LLM calls of all summaries share one pool; each summary is coordinated from summary_jobs,
+# so neither holds a Starlette threadpool token needed by requests
+summary_llm_executor = ThreadPoolExecutor(
+    max_workers=max(1, SUMMARY_MAX_CONCURRENCY), thread_name_prefix="summary-llm"
+)
+summary_jobs = ThreadPoolExecutor(max_workers=max(1, SUMMARY_MAX_CONCURRENCY), thread_name_prefix="summary")
+
+# Heavy modules imported by the background preload, in dependency order
+PRELOAD_MODULES = [
+    "langchain_core",
+    "langchain",
+    "langchain_community.document_loaders",
+    "langchain.text_splitter",
+    "faiss",
+    "langchain_community.vectorstores",
+] + (
+    ["sentence_transformers", "langchain_huggingface"]
+    if EMBEDDING_BACKEND == "torch"
+    else ["onnxruntime", "onnx_embeddings"]
+) + [
+    "custom_langchain",
+]
+
+# Query text -> embedding, and (filename, document version, query, k) -> docstore ids
+QUERY_EMBEDDING_CACHE_SIZE = int(os.environ.get("QUERY_EMBEDDING_CACHE_SIZE", "2048"))
+RETRIEVAL_CACHE_SIZE = int(os.environ.get("RETRIEVAL_CACHE_SIZE", "4096"))
+query_embedding_cache = LRUCache(QUERY_EMBEDDING_CACHE_SIZE)
+retrieval_cache = LRUCache(RETRIEVAL_CACHE_SIZE)
+
+# Streamed tokens are merged into one SSE frame per time window or size threshold
+SSE_COALESCE_SECONDS = float(os.environ.get("SSE_COALESCE_SECONDS", "0.05"))
+SSE_COALESCE_CHARS = int(os.environ.get("SSE_COALESCE_CHARS", "512"))
+
+# Profiling and memory snapshot endpoints are disabled unless an admin token is configured
+ADMIN_TOKEN = os.environ.get("ADMIN_TOKEN", "")
+profile_store = ProfileStore()
+memory_snapshots = MemorySnapshots()
+
+preloader = Preloader()
+
 # === Pydantic models ===
 
 class QuestionRequest(BaseModel):
@@ -60,6 +189,68 @@ class ChatMessageResponse(BaseModel):
     session_id: str
     success: bool
 
+class CompareFilesRequest(BaseModel):
+    filename_a: str
+    filename_b: str
+    question: Optional[str] = None
+
+class ComparedSection(BaseModel):
+    index: int
+    page: Optional[int] = None
+    content: str
+
+class ChangedSection(BaseModel):
+    a: ComparedSection
+    b: ComparedSection
+    similarity: float
+
+class CompareFilesResponse(BaseModel):
+    comparison: str
+    matched_count: int
+    changed: List[ChangedSection]
+    unique_a: List[ComparedSection]
+    unique_b: List[ComparedSection]
+    omitted_sections: int = 0
+    success: bool
+
+class CreateUploadRequest(BaseModel):
+    filename: str
+    size: int
+    sha256: Optional[str] = None
+
+class FinalizeUploadRequest(BaseModel):
+    sha256: Optional[str] = None
+    summarize: Optional[bool] = None
+    doc_type: Optional[str] = None
+
+class SearchRequest(BaseModel):
+    query: str
+    filenames: Optional[List[str]] = None  # all uploaded PDFs when omitted
+    k: int = Field(5, ge=1, le=50)
+    mmr: bool = False
+    fetch_k: int = Field(20, ge=1, le=200)
+    lambda_mult: float = Field(0.5, ge=0.0, le=1.0)
+    page_start: Optional[int] = None  # page numbers are 0-based, as stored by the PDF loader
+    page_end: Optional[int] = None
+
+class SearchResult(BaseModel):
+    filename: str
+    content: str
+    score: float
+    page: Optional[int] = None
+    chunk_index: int
+
+class SearchResponse(BaseModel):
+    query: str
+    results: List[SearchResult]
+
+class SummaryResponse(BaseModel):
+    filename: str
+    status: str
+    summary: Optional[str] = None
+    section_count: int = 0
+    error: Optional[str] = None
+
 
 # === Helper Functions ===
 
@@ -75,28 +266,327 @@ def load_config():
     return config
 
 
-def process_pdf_and_create_vectorstore(pdf_path: str, filename: str) -> FAISS:
-    """Load PDF, chunk text, create and store FAISS vector indices"""
-    loader = PyMuPDFLoader(pdf_path)
-    documents = loader.load()
-    splitter = RecursiveCharacterTextSplitter(chunk_size=400, chunk_overlap=50)
-    chunks = splitter.split_documents(documents)
+def create_llm() -> "LLM":
+    """Create an LLM client from the keys.txt configuration"""
+    from custom_langchain import MyDualEndpointLLM as LLM
 
-    embedding_model = HuggingFaceEmbeddings(model_name="sentence-transformers/all-MiniLM-L6-v2")
-    vector_store = FAISS.from_documents(chunks, embedding_model)
+    config = load_config()
+    return LLM(
+        secret_key=config["API_KEY"],
+        non_stream_url=config["AI_Agent_URL"],
+        stream_url=config["AI_Agent_Stream_URL"]
+    )
+
+
+def process_pdf_and_create_vectorstore(
+    pdf_path: str,
+    filename: str,
+    index_key: Optional[str] = None,
+    chunk_size: int = CHUNK_SIZE,
+    chunk_overlap: int = CHUNK_OVERLAP,
+) -> "FAISS":
+    """
+    Load PDF, chunk text, create and store FAISS vector indices.
+    With an index_key, an index already in the artifact store is loaded instead of rebuilt,
+    and a newly built index is saved there.
+    """
+    from langchain_community.vectorstores import FAISS
+
+    if index_key and artifact_store.has(index_key):
+        artifact_store.touch(index_key)
+        with profile_stage("load index"):
+            vector_store = FAISS.load_local(artifact_store.path(index_key), get_embedding_model())
+    else:
+        vector_store = build_vector_store(pdf_path, chunk_size, chunk_overlap)
+        if index_key:
+            artifact_store.put_dir(index_key, "faiss_index", vector_store.save_local)
     vector_stores[filename] = vector_store
     return vector_store
 
 
+def load_vector_store(filename: str) -> "FAISS":
+    """Reload a demoted document's index from its on-disk form in the artifact store"""
+    from langchain_community.vectorstores import FAISS
+
+    index_key = uploaded_files[filename]["index_key"]
+    artifact_store.touch(index_key)
+    with profile_stage("load index"):
+        return FAISS.load_local(artifact_store.path(index_key), get_embedding_model())
+
+
+async def ensure_resident(*filenames: Optional[str]) -> Dict[str, "FAISS"]:
+    """
+    Return the stores of the given documents, reloading demoted ones off the event loop.
+    Callers use the returned stores rather than vector_stores, which may demote them again
+    (and reload on the event loop) before the request is done. Concurrent reloads are shared.
+    """
+    stores = {}
+    for filename in filenames:
+        if not filename or filename in stores:
+            continue
+        store = vector_stores.get_resident(filename)
+        if store is None:
+            store = await run_in_threadpool(vector_stores.get, filename)
+        if store is None:
+            raise KeyError(f"PDF '{filename}' was deleted")
+        stores[filename] = store
+    return stores
+
+
+def get_store_documents(vector_store: "FAISS") -> List:
+    """Return the chunk documents of a FAISS store in the order they were indexed"""
+    return [
+        vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+        for i in range(len(vector_store.index_to_docstore_id))
+    ]
+
+
+def get_store_chunks(vector_store: "FAISS") -> List[str]:
+    """Return the chunk texts of a FAISS store in the order they were indexed"""
+    return [doc.page_content for doc in get_store_documents(vector_store)]
+
+
+def get_store_embeddings(vector_store: "FAISS"):
+    """Return the stored chunk embeddings as an (n_chunks, dim) matrix without re-embedding"""
+    return vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+
+
+def build_document_summary(filename: str, vector_store: "FAISS", summary_key: str):
+    """Background stage: map-reduce summarize the whole document and store it next to its index"""
+    try:
+        result = summarize_document(create_llm(), get_store_chunks(vector_store), summary_llm_executor)
+        created_at = datetime.now()
+        artifact_store.put_json(summary_key, "summary", {
+            "summary": result["summary"],
+            "section_summaries": result["section_summaries"],
+            "created_at": created_at.isoformat(),
+        })
+        entry = {
+            "status": "ready",
+            "summary": result["summary"],
+            "section_summaries": result["section_summaries"],
+            "created_at": created_at,
+        }
+    except Exception as e:
+        entry = {"status": "failed", "error": str(e), "created_at": datetime.now()}
+
+    # Drop the result if the document was deleted or replaced while summarizing
+    if summary_key in uploaded_files.get(filename, {}).get("artifacts", []):
+        document_summaries[filename] = entry
+
+
+def get_ready_summary(filename: Optional[str], message: str) -> Optional[str]:
+    """Return the precomputed summary if the message asks for one and it is available"""
+    if not filename or not is_summary_request(message):
+        return None
+    entry = document_summaries.get(filename)
+    if entry and entry["status"] == "ready":
+        return entry["summary"]
+    return None
+
+
+def embed_query_cached(query: str):
+    """Embed a query, reusing the embedding of identical earlier queries"""
+    import numpy as np
+
+    embedding = query_embedding_cache.get(query)
+    if embedding is None:
+        embedding = np.asarray(get_embedding_model().embed_query(query), dtype=np.float32)
+        query_embedding_cache.put(query, embedding)
+    return embedding
+
+
+def retrieve_documents(vector_store: "FAISS", filename: str, query: str, k: int) -> List:
+    """Top-k chunks of a document for a query, served from the retrieval cache when possible"""
+    key = (filename, document_versions.get(filename, 0), query, k)
+    with profile_stage("retrieve"):
+        doc_ids = retrieval_cache.get(key)
+        if doc_ids is None:
+            # Same search as vector_store.similarity_search, but keeps the docstore ids for caching
+            _, indices = vector_store.index.search(embed_query_cached(query).reshape(1, -1), k)
+            doc_ids = [vector_store.index_to_docstore_id[i] for i in indices[0] if i != -1]
+            retrieval_cache.put(key, doc_ids)
+        return [vector_store.docstore.search(doc_id) for doc_id in doc_ids]
+
+
+def search_documents(
+    stores: Dict[str, "FAISS"],
+    query: str,
+    k: int,
+    fetch_k: int,
+    mmr: bool,
+    lambda_mult: float,
+    page_start: Optional[int] = None,
+    page_end: Optional[int] = None,
+) -> List[Dict]:
+    """
+    Top-k chunks across several documents with cosine similarity scores.
+    Optionally restricted to a page range and diversified with maximal marginal relevance.
+    """
+    import numpy as np
+
+    query_embedding = embed_query_cached(query)
+    filter_pages = page_start is not None or page_end is not None
+    per_store = max(k, fetch_k) if mmr else k
+
+    candidates = []
+    for filename, vector_store in stores.items():
+        # A flat index scans every vector anyway, so filtering can search them all
+        n = vector_store.index.ntotal if filter_pages else min(per_store, vector_store.index.ntotal)
+        if n == 0:
+            continue
+        distances, indices = vector_store.index.search(query_embedding.reshape(1, -1), n)
+        kept = 0
+        for distance, i in zip(distances[0], indices[0]):
+            if i == -1 or kept >= per_store:
+                break
+            doc = vector_store.docstore.search(vector_store.index_to_docstore_id[i])
+            page = doc.metadata.get("page")
+            if filter_pages and (
+                page is None
+                or (page_start is not None and page < page_start)
+                or (page_end is not None and page > page_end)
+            ):
+                continue
+            kept += 1
+            candidates.append({
+                "filename": filename,
+                "content": doc.page_content,
+                # Squared L2 distance between unit vectors -> cosine similarity
+                "score": float(1.0 - distance / 2.0),
+                "page": page,
+                "chunk_index": int(i),
+            })
+
+    candidates.sort(key=lambda c: c["score"], reverse=True)
+    if not mmr:
+        return candidates[:k]
+
+    from langchain_community.vectorstores.utils import maximal_marginal_relevance
+
+    candidates = candidates[:max(k, fetch_k)]
+    embeddings = [
+        stores[c["filename"]].index.reconstruct(c["chunk_index"]) for c in candidates
+    ]
+    selected = maximal_marginal_relevance(
+        np.asarray(query_embedding), embeddings, lambda_mult=lambda_mult, k=min(k, len(candidates))
+    )
+    return [candidates[i] for i in selected]
+
+
+def document_k(filename: str, default: int) -> int:
+    """Number of chunks to retrieve for a document: its tuned k, else the endpoint default"""
+    return uploaded_files.get(filename, {}).get("k") or default
+
+
+def invalidate_document_cache(filename: str):
+    """Forget cached retrieval results of a document whose content changed or was removed"""
+    document_versions[filename] = document_versions.get(filename, 0) + 1
+    retrieval_cache.discard_where(lambda key: key[0] == filename)
+
+
+def ingest_pdf(
+    file_path: str,
+    filename: str,
+    size: int,
+    summarize: Optional[bool],
+    sha256: str = "",
+    doc_type: Optional[str] = None,
+    move: bool = True,
+) -> Dict:
+    """
+    Move (or copy) a PDF into the artifact store, index it and schedule its background summary.
+    Index and summary of identical content uploaded before are reused from the store.
+    Chunking and k follow the retrieval settings of the document type (the default entry if untyped).
+    """
+    settings = load_retrieval_settings(doc_type)
+    pdf_key = sha256 or file_sha256(file_path)
+    index_key = derived_key(
+        pdf_key, "faiss", settings["chunk_size"], settings["chunk_overlap"], EMBEDDING_MODEL_NAME, EMBEDDING_BACKEND
+    )
+    summary_key = derived_key(index_key, "summary")
+    artifacts = [pdf_key, index_key, summary_key]
+
+    # Reference the artifacts before writing them so eviction can never remove them mid-ingestion
+    artifact_store.acquire(artifacts)
+    try:
+        artifact_store.put_file(file_path, "pdf", sha256=pdf_key, move=move)
+        vector_store = process_pdf_and_create_vectorstore(
+            artifact_store.path(pdf_key), filename, index_key,
+            chunk_size=settings["chunk_size"], chunk_overlap=settings["chunk_overlap"],
+        )
+    except Exception:
+        artifact_store.release(artifacts)
+        raise
+    invalidate_document_cache(filename)
+
+    previous = uploaded_files.get(filename)
+    uploaded_files[filename] = {
+        "path": artifact_store.path(pdf_key),
+        "size": size,
+        "sha256": pdf_key,
+        "index_key": index_key,
+        "artifacts": artifacts,
+        "doc_type": doc_type,
+        "k": settings["k"],
+    }
+    if previous:
+        artifact_store.release(previous["artifacts"])
+
+    # Precompute the document summary in the background
+    document_summaries.pop(filename, None)
+    stored_summary = artifact_store.get_json(summary_key)
+    if stored_summary:
+        artifact_store.touch(summary_key)
+        document_summaries[filename] = dict(
+            stored_summary, status="ready", created_at=datetime.fromisoformat(stored_summary["created_at"])
+        )
+    elif SUMMARIZE_ON_UPLOAD if summarize is None else summarize:
+        document_summaries[filename] = {"status": "pending", "created_at": datetime.now()}
+        summary_jobs.submit(build_document_summary, filename, vector_store, summary_key)
+
+    return {
+        "success": True,
+        "message": f"PDF '{filename}' uploaded and processed.",
+        "filename": filename
+    }
+
+
+def is_admin_token(token: Optional[str]) -> bool:
+    return bool(ADMIN_TOKEN) and token is not None and hmac.compare_digest(token, ADMIN_TOKEN)
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    if not is_admin_token(x_admin_token):
+        raise HTTPException(status_code=403, detail="Invalid admin token.")
+
+
+def estimate_state_sizes() -> Dict:
+    """Approximate sizes of the in-memory sessions and vector stores"""
+    messages = [m for s in chat_sessions.values() for m in s["memory"].chat_memory.messages]
+    resident = vector_stores.resident_stores()
+    vectors = sum(store.index.ntotal for store in resident)
+    return {
+        "chat_sessions": {
+            "count": len(chat_sessions),
+            "messages": len(messages),
+            "message_chars": sum(len(m.content) for m in messages),
+        },
+        "vector_stores": {
+            "count": len(vector_stores),
+            "resident": len(resident),
+            "vectors": vectors,
+            "vector_bytes": sum(store.index.ntotal * store.index.d * 4 for store in resident),
+        },
+    }
+
+
 def get_or_create_session(session_id: str) -> Dict:
     """Retrieve or initialize a chat session with conversation memory and LLM"""
     if session_id not in chat_sessions:
-        config = load_config()
-        llm = LLM(
-            secret_key=config["API_KEY"],
-            non_stream_url=config["AI_Agent_URL"],
-            stream_url=config["AI_Agent_Stream_URL"]
-        )
+        from langchain.memory import ConversationBufferMemory
+
+        llm = create_llm()
         chat_sessions[session_id] = {
             "memory": ConversationBufferMemory(
                 memory_key="chat_history",
@@ -118,7 +608,7 @@ def build_strict_prompt(context: str, history_messages: List, user_message: str)
     history_text = ""
     if history_messages:
         history_text = "\n\nPrevious conversation:\n" + "\n".join(
-            f"{'User' if isinstance(m, HumanMessage) else 'Assistant'}: {m.content}"
+            f"{'User' if m.type == 'human' else 'Assistant'}: {m.content}"
             for m in history_messages[-10:] 
         )
     
@@ -154,6 +644,13 @@ async def root():
     return {"message": "Agentic PDF Chatbot API running", "status": "healthy"}
 
 
+@app.get("/ready")
+async def readiness_check():
+    """Readiness probe: 503 until heavy modules and the embedding model are loaded"""
+    report = preloader.report()
+    return JSONResponse(status_code=200 if preloader.is_ready else 503, content=report)
+
+
 @app.get("/health")
 async def health_check():
     try:
@@ -175,7 +672,11 @@ async def health_check():
 
 
 @app.post("/upload")
-async def upload_pdf(file: UploadFile = File(...)):
+async def upload_pdf(
+    file: UploadFile = File(...),
+    summarize: Optional[bool] = Query(None),
+    doc_type: Optional[str] = Query(None),
+):
     if not file.filename or not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
     
@@ -187,42 +688,95 @@ async def upload_pdf(file: UploadFile = File(...)):
     
     try:
         sanitized_filename = os.path.basename(file.filename)
-        file_path = os.path.join(TMP_FOLDER, sanitized_filename)
+        file_path = artifact_store.staging_path()
         with open(file_path, "wb") as f:
             f.write(content)
         
-        # Process PDF into vector store
-        process_pdf_and_create_vectorstore(file_path, sanitized_filename)
+        # Process PDF into vector store; parsing and embedding block, so off the event loop
+        return await run_in_threadpool(
+            ingest_pdf, file_path, sanitized_filename, len(content), summarize, doc_type=doc_type
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
 
-        uploaded_files[sanitized_filename] = {
-            "path": file_path,
-            "size": len(content)
-        }
 
-        return {
-            "success": True,
-            "message": f"PDF '{sanitized_filename}' uploaded and processed.",
-            "filename": sanitized_filename
-        }
+# --- Resumable uploads: create, append parts, finalize ---
+
+@app.post("/upload/resumable")
+async def create_resumable_upload(request: CreateUploadRequest):
+    """Start a resumable upload; parts are then sent with PUT at increasing offsets"""
+    if not request.filename.lower().endswith(".pdf"):
+        raise HTTPException(status_code=400, detail="Only PDF files are allowed.")
+    try:
+        upload = resumable_uploads.create(os.path.basename(request.filename), request.size, request.sha256 or "")
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    return dict(upload, part_size=RESUMABLE_PART_SIZE)
+
+
+@app.get("/upload/resumable/{upload_id}")
+async def get_resumable_upload(upload_id: str):
+    """Current offset of an upload, i.e. where the client should resume"""
+    try:
+        return resumable_uploads.get(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@app.put("/upload/resumable/{upload_id}")
+async def append_resumable_upload(upload_id: str, request: Request, offset: int = Query(...)):
+    """Append the raw request body at the given offset, streaming it to disk"""
+    try:
+        return await resumable_uploads.append(upload_id, offset, request.stream())
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+
+
+@app.post("/upload/resumable/{upload_id}/finalize")
+async def finalize_resumable_upload(upload_id: str, request: FinalizeUploadRequest):
+    """Verify the checksum of a completed upload and hand the PDF to ingestion"""
+    # Hashing and ingesting a large PDF takes long, so both run off the event loop
+    try:
+        upload = await run_in_threadpool(resumable_uploads.finalize, upload_id, request.sha256 or "")
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    try:
+        # Copy rather than move, so the verified upload survives a failed ingestion for a retry
+        result = await run_in_threadpool(
+            ingest_pdf, upload["path"], upload["filename"], upload["size"], request.summarize,
+            sha256=upload["sha256"], doc_type=request.doc_type, move=False,
+        )
     except Exception as e:
+        resumable_uploads.release(upload_id)
         raise HTTPException(status_code=500, detail=f"Error processing PDF: {str(e)}")
+    resumable_uploads.complete(upload_id)
+    return result
+
+
+@app.delete("/upload/resumable/{upload_id}")
+async def abort_resumable_upload(upload_id: str):
+    try:
+        resumable_uploads.abort(upload_id)
+    except UploadError as e:
+        raise HTTPException(status_code=e.status_code, detail=e.message)
+    return {"success": True}
 
 
 @app.delete("/delete_file")
 async def delete_file(filename: str = Query(...)):
     file_info = uploaded_files.pop(filename, None)
     vector_stores.pop(filename, None)
-    if file_info and os.path.exists(file_info["path"]):
-        try:
-            os.remove(file_info["path"])
-            return {"success": True}
-        except Exception as e:
-            return {"success": False, "message": f"Error deleting file: {str(e)}"}
+    document_summaries.pop(filename, None)
+    invalidate_document_cache(filename)
+    if file_info:
+        # The content stays in the artifact store until evicted, as other uploads may share it
+        artifact_store.release(file_info["artifacts"])
+        return {"success": True}
     return {"success": False, "message": "File not found"}
 
 
 @app.post("/chat", response_model=ChatMessageResponse)
-async def chat_message(request: ChatMessageRequest):
+async def chat_message(request: ChatMessageRequest, http_request: Request):
     """
     Chat endpoint that responds only using summarization, comparison,
     or question answering based on PDFs + chat history.
@@ -230,35 +784,42 @@ async def chat_message(request: ChatMessageRequest):
     if request.filename and request.filename not in vector_stores:
         raise HTTPException(status_code=400, detail="PDF not found. Upload before chatting.")
     try:
+        stores = await ensure_resident(request.filename)
         session = get_or_create_session(request.session_id)
         memory = session["memory"]
         llm = session["llm"]
         
-        # Retrieve document context if PDF filename provided
-        context = ""
+        # Serve whole-document summary requests from the precomputed summary
+        response = get_ready_summary(request.filename, request.message)
         sources = []
-        if request.filename:
-            vector_store = vector_stores[request.filename]
-            retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-            relevant_docs = retriever.get_relevant_documents(request.message)
-            context = "\n\n".join([doc.page_content for doc in relevant_docs])
-            sources = [doc.page_content for doc in relevant_docs]
+        if response is None:
+            # Retrieve document context if PDF filename provided
+            context = ""
+            if request.filename:
+                k = document_k(request.filename, CHAT_K)
+                relevant_docs = retrieve_documents(stores[request.filename], request.filename, request.message, k=k)
+                context = "\n\n".join([doc.page_content for doc in relevant_docs])
+                sources = [doc.page_content for doc in relevant_docs]
 
-        prompt = build_strict_prompt(context, memory.chat_memory.messages, request.message)
+            prompt = build_strict_prompt(context, memory.chat_memory.messages, request.message)
 
-        # Invoke language model
-        response = llm.invoke(prompt)
+            # Invoke language model
+            with profile_stage("upstream"):
+                response = llm.invoke(prompt)
 
         # Update conversation memory
         memory.chat_memory.add_user_message(request.message)
         memory.chat_memory.add_ai_message(response)
         session["message_count"] += 1
 
-        return ChatMessageResponse(
-            content=response,
-            sources=sources,
-            session_id=request.session_id,
-            success=True,
+        return json_response(
+            ChatMessageResponse(
+                content=response,
+                sources=sources,
+                session_id=request.session_id,
+                success=True,
+            ).model_dump(),
+            http_request.headers.get("accept-encoding", ""),
         )
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Chat error: {str(e)}")
@@ -268,30 +829,42 @@ async def chat_message(request: ChatMessageRequest):
 async def chat_message_stream(request: ChatMessageRequest):
     """
     Streaming chat endpoint same as /chat but responses are streamed chunk-by-chunk.
+    Small upstream chunks are coalesced into fewer frames; the final event carries only
+    what the client has not received yet (sources and status), not the full text again.
     """
 
     async def generate_stream() -> AsyncGenerator[str, None]:
         try:
+            stores = await ensure_resident(request.filename)
             session = get_or_create_session(request.session_id)
             memory = session["memory"]
             llm = session["llm"]
 
             context = ""
             sources = []
-            if request.filename:
-                vector_store = vector_stores[request.filename]
-                retriever = vector_store.as_retriever(search_kwargs={"k": 3})
-                relevant_docs = retriever.get_relevant_documents(request.message)
-                context = "\n\n".join([doc.page_content for doc in relevant_docs])
-                sources = [doc.page_content for doc in relevant_docs]
-
-            prompt = build_strict_prompt(context, memory.chat_memory.messages, request.message)
-
-            # Stream response chunks
             response_chunks = []
-            async for chunk in llm.stream(prompt):
-                response_chunks.append(chunk)
-                yield f"data: {json.dumps({'content': chunk})}\n\n"
+            summary = get_ready_summary(request.filename, request.message)
+            if summary is not None:
+                # Precomputed summary is sent as a single chunk
+                response_chunks.append(summary)
+                yield sse_event({"content": summary})
+            else:
+                if request.filename:
+                    k = document_k(request.filename, CHAT_K)
+                    relevant_docs = retrieve_documents(
+                        stores[request.filename], request.filename, request.message, k=k
+                    )
+                    context = "\n\n".join([doc.page_content for doc in relevant_docs])
+                    sources = [doc.page_content for doc in relevant_docs]
+
+                prompt = build_strict_prompt(context, memory.chat_memory.messages, request.message)
+
+                # Stream response chunks; the upstream iterator blocks, so it runs in the threadpool
+                with profile_stage("upstream"):
+                    upstream = iterate_in_threadpool(profile_iterator(llm.stream(prompt)))
+                    async for chunk in coalesce_chunks(upstream, SSE_COALESCE_SECONDS, SSE_COALESCE_CHARS):
+                        response_chunks.append(chunk)
+                        yield sse_event({"content": chunk})
 
             full_response = "".join(response_chunks)
             memory.chat_memory.add_user_message(request.message)
@@ -300,12 +873,12 @@ async def chat_message_stream(request: ChatMessageRequest):
 
             # Send final event with sources and success
             final_response = {
-                "content": full_response,
+                "done": True,
                 "sources": sources,
                 "session_id": request.session_id,
                 "success": True
             }
-            yield f"data: {json.dumps(final_response)}\n\n"
+            yield sse_event(final_response)
             yield "data: [DONE]\n\n"
 
         except Exception as e:
@@ -314,27 +887,27 @@ async def chat_message_stream(request: ChatMessageRequest):
                 "session_id": request.session_id,
                 "success": False
             }
-            yield f"data: {json.dumps(error_response)}\n\n"
+            yield sse_event(error_response)
             yield "data: [DONE]\n\n"
 
     return StreamingResponse(generate_stream(), media_type="text/event-stream")
 
 
 @app.get("/chat/history")
-async def get_chat_history(session_id: str):
+async def get_chat_history(session_id: str, http_request: Request):
     """Return full chat history for given session"""
     session = chat_sessions.get(session_id)
     if not session:
-        return {"messages": []}
+        return json_response({"messages": []})
     messages = [
         {
-            "role": "user" if isinstance(m, HumanMessage) else "assistant",
+            "role": "user" if m.type == "human" else "assistant",
             "content": m.content,
             "timestamp": session["created_at"].isoformat(),
         }
         for m in session["memory"].chat_memory.messages
     ]
-    return {"messages": messages}
+    return json_response({"messages": messages}, http_request.headers.get("accept-encoding", ""))
 
 
 @app.post("/chat/clear")
@@ -346,43 +919,224 @@ async def clear_chat_session(session_id: str):
 
 
 @app.post("/ask", response_model=QuestionResponse)
-async def ask_question(request: QuestionRequest):
+async def ask_question(request: QuestionRequest, http_request: Request):
     """
-    Direct question answering that strictly uses RetrievalQA chain.
-    Returns answer and source chunks.
+    Direct question answering using the same "stuff" QA chain as RetrievalQA,
+    fed from the cached retrieval. Returns answer and source chunks.
     """
     if request.filename not in vector_stores:
         raise HTTPException(status_code=400, detail="PDF not found. Please upload first.")
     try:
-        config = load_config()
-        haiku_llm = LLM(
-            secret_key=config["API_KEY"],
-            non_stream_url=config["AI_Agent_URL"],
-            stream_url=config["AI_Agent_Stream_URL"],
+        from langchain.chains.question_answering import load_qa_chain
+
+        stores = await ensure_resident(request.filename)
+        haiku_llm = create_llm()
+        k = document_k(request.filename, ASK_K)
+        source_documents = retrieve_documents(stores[request.filename], request.filename, request.question, k=k)
+
+        # LangChain's stuff QA chain, can be customized in custom_langchain.py with strict prompts
+        qa_chain = load_qa_chain(llm=haiku_llm, chain_type="stuff")
+        with profile_stage("upstream"):
+            result = qa_chain.invoke({"input_documents": source_documents, "question": request.question})
+
+        answer = result.get("output_text", "")
+        source_chunks = [doc.page_content for doc in source_documents]
+
+        return json_response(
+            QuestionResponse(answer=answer, source_chunks=source_chunks).model_dump(),
+            http_request.headers.get("accept-encoding", ""),
         )
-        vector_store = vector_stores[request.filename]
-        retriever = vector_store.as_retriever(search_kwargs={"k": 5})
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
 
-        # LangChain's RetrievalQA, can be customized in custom_langchain.py with strict prompts
-        qa_chain = RetrievalQA.from_chain_type(
-            llm=haiku_llm, chain_type="stuff", retriever=retriever, return_source_documents=True
+
+@app.post("/search", response_model=SearchResponse)
+async def search(request: SearchRequest, http_request: Request):
+    """
+    Retrieval only: top-k chunks with similarity scores and pages, without calling the LLM.
+    Supports MMR diversification and page-range filters across one or more PDFs.
+    """
+    filenames = request.filenames or list(vector_stores.keys())
+    if not filenames:
+        # Nothing uploaded: answer without loading the embedding model
+        return {"query": request.query, "results": []}
+    missing = [f for f in filenames if f not in vector_stores]
+    if missing:
+        raise HTTPException(status_code=400, detail=f"PDF not found: {', '.join(missing)}. Please upload first.")
+    try:
+        stores = await ensure_resident(*filenames)
+        with profile_stage("retrieve"):
+            results = search_documents(
+                stores,
+                request.query,
+                k=request.k,
+                fetch_k=request.fetch_k,
+                mmr=request.mmr,
+                lambda_mult=request.lambda_mult,
+                page_start=request.page_start,
+                page_end=request.page_end,
+            )
+        return json_response(
+            {"query": request.query, "results": results},
+            http_request.headers.get("accept-encoding", ""),
         )
-        result = qa_chain.invoke(request.question)
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Search error: {str(e)}")
+
+
+@app.get("/cache/stats")
+async def cache_stats():
+    """Hit-rate counters of the query embedding and retrieval caches"""
+    return {
+        "query_embeddings": query_embedding_cache.stats(),
+        "retrieval": retrieval_cache.stats(),
+        "artifacts": artifact_store.stats(),
+        "vector_stores": vector_stores.stats(),
+    }
+
+
+@app.get("/summary", response_model=SummaryResponse)
+async def get_document_summary(filename: str = Query(...)):
+    """Return the precomputed whole-document summary and its build status"""
+    if filename not in vector_stores:
+        raise HTTPException(status_code=404, detail="PDF not found. Please upload first.")
+    entry = document_summaries.get(filename)
+    if not entry:
+        return SummaryResponse(filename=filename, status="not_requested")
+    return SummaryResponse(
+        filename=filename,
+        status=entry["status"],
+        summary=entry.get("summary"),
+        section_count=len(entry.get("section_summaries", [])),
+        error=entry.get("error"),
+    )
 
-        answer = result.get("result", "")
-        source_chunks = [doc.page_content for doc in result.get("source_documents", [])]
 
-        return QuestionResponse(answer=answer, source_chunks=source_chunks)
+@app.post("/compare_files", response_model=CompareFilesResponse)
+async def compare_files(request: CompareFilesRequest, http_request: Request):
+    """
+    Compare two uploaded PDFs using a chunk similarity matrix.
+    Only changed and unique sections are sent to the LLM.
+    """
+    for filename in (request.filename_a, request.filename_b):
+        if filename not in vector_stores:
+            raise HTTPException(status_code=400, detail=f"PDF '{filename}' not found. Please upload first.")
+    try:
+        from doc_compare import classify_sections, build_comparison_prompt
+
+        stores = await ensure_resident(request.filename_a, request.filename_b)
+        store_a = stores[request.filename_a]
+        store_b = stores[request.filename_b]
+        docs_a = get_store_documents(store_a)
+        docs_b = get_store_documents(store_b)
+        texts_a = [doc.page_content for doc in docs_a]
+        texts_b = [doc.page_content for doc in docs_b]
+
+        sections = classify_sections(get_store_embeddings(store_a), get_store_embeddings(store_b))
+
+        omitted = 0
+        if sections["changed"] or sections["unique_a"] or sections["unique_b"]:
+            prompt, omitted = build_comparison_prompt(
+                request.filename_a, request.filename_b, texts_a, texts_b, sections, request.question or ""
+            )
+            with profile_stage("upstream"):
+                comparison = create_llm().invoke(prompt)
+        else:
+            comparison = "The two documents have the same content; no differing sections were found."
+
+        def section(docs, i):
+            return ComparedSection(index=i, page=docs[i].metadata.get("page"), content=docs[i].page_content)
+
+        return json_response(
+            CompareFilesResponse(
+                comparison=comparison,
+                matched_count=sections["matched"],
+                changed=[
+                    ChangedSection(a=section(docs_a, i), b=section(docs_b, j), similarity=score)
+                    for i, j, score in sections["changed"]
+                ],
+                unique_a=[section(docs_a, i) for i in sections["unique_a"]],
+                unique_b=[section(docs_b, i) for i in sections["unique_b"]],
+                omitted_sections=omitted,
+                success=True,
+            ).model_dump(),
+            http_request.headers.get("accept-encoding", ""),
+        )
     except Exception as e:
-        raise HTTPException(status_code=500, detail=f"Error processing question: {str(e)}")
+        raise HTTPException(status_code=500, detail=f"Error comparing PDFs: {str(e)}")
+
 
+# --- Admin: request profiles and memory snapshots (require X-Admin-Token) ---
 
-# --- Cleanup uploaded PDFs on shutdown ---
+@app.get("/admin/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    return {"profiles": profile_store.list()}
+
+
+@app.get("/admin/profiles/{profile_id}", dependencies=[Depends(require_admin)])
+async def download_profile(profile_id: str):
+    """Download the report of a request profiled with the X-Profile header"""
+    profile = profile_store.get(profile_id)
+    if not profile:
+        raise HTTPException(status_code=404, detail="Profile not found")
+    if profile.duration is None:
+        raise HTTPException(status_code=409, detail="Request is still running")
+    return PlainTextResponse(
+        profile.report(),
+        headers={"Content-Disposition": f'attachment; filename="profile-{profile_id}.txt"'},
+    )
+
+
+@app.post("/admin/memory/snapshots", dependencies=[Depends(require_admin)])
+async def take_memory_snapshot():
+    """Take a tracemalloc snapshot (tracing starts with the first one)"""
+    return memory_snapshots.take(estimate_state_sizes())
+
+
+@app.get("/admin/memory/snapshots", dependencies=[Depends(require_admin)])
+async def list_memory_snapshots():
+    return {"snapshots": memory_snapshots.list()}
+
+
+@app.get("/admin/memory/diff", dependencies=[Depends(require_admin)])
+async def diff_memory_snapshots(
+    base: str = Query(...),
+    target: str = Query(...),
+    limit: int = Query(20, ge=1, le=200),
+    group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$"),
+):
+    """Largest allocation growth between two snapshots, with session and vector store sizes"""
+    try:
+        return memory_snapshots.diff(base, target, limit, group_by)
+    except KeyError:
+        raise HTTPException(status_code=404, detail="Snapshot not found")
+
+
+@app.delete("/admin/memory/snapshots", dependencies=[Depends(require_admin)])
+async def clear_memory_snapshots():
+    """Drop all snapshots and stop tracemalloc"""
+    memory_snapshots.clear()
+    return {"success": True}
+
+
+# --- Preload heavy modules once the server is starting ---
+
+@app.on_event("startup")
+def start_preload():
+    preloader.start(PRELOAD_MODULES, [("load embedding model", get_embedding_model)])
+
+
+# --- Trim stored artifacts to the disk budget on shutdown; hot data survives restarts ---
 
 @app.on_event("shutdown")
-def cleanup_tmp_folder():
-    if os.path.exists(TMP_FOLDER):
-        shutil.rmtree(TMP_FOLDER)
+def trim_artifact_store():
+    # Pending summaries would only be dropped with the in-memory state anyway
+    summary_jobs.shutdown(wait=False, cancel_futures=True)
+    summary_llm_executor.shutdown(wait=False, cancel_futures=True)
+    artifact_store.gc()
+
+
+preloader.timings["import api_server"] = round(time.perf_counter() - MODULES_IMPORT_STARTED, 4)
 
 
 # === Main ===
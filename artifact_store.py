@@ -0,0 +1,213 @@
+"""
+Content-addressed on-disk store for uploaded PDFs, FAISS indexes and derived artifacts.
+
+Every artifact lives under objects/<key[:2]>/<key>, where the key is the SHA-256 of the
+content (for source files) or of the source key plus build parameters (for derived
+artifacts). Writes go to a staging directory first and are moved into place with an
+atomic rename. When the total size exceeds the disk budget, the least recently used
+artifacts that no uploaded file references are evicted.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from typing import Callable, Dict, List, Optional
+
+HASH_BLOCK_SIZE = 1024 * 1024
+
+
+def file_sha256(path: str) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(HASH_BLOCK_SIZE), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def derived_key(source_key: str, *params) -> str:
+    """Key of an artifact derived from source_key with the given build parameters"""
+    return hashlib.sha256("|".join([source_key, *map(str, params)]).encode("utf-8")).hexdigest()
+
+
+def _is_key(name: str) -> bool:
+    return len(name) == 64 and all(c in "0123456789abcdef" for c in name)
+
+
+def _disk_size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+    total = 0
+    for dirpath, _, filenames in os.walk(path):
+        for name in filenames:
+            total += os.path.getsize(os.path.join(dirpath, name))
+    return total
+
+
+def _remove(path: str):
+    if os.path.isdir(path):
+        shutil.rmtree(path, ignore_errors=True)
+    elif os.path.exists(path):
+        os.remove(path)
+
+
+class ArtifactStore:
+    def __init__(self, root: str, budget_bytes: int):
+        self.root = root
+        self.budget_bytes = budget_bytes
+        self.objects_dir = os.path.join(root, "objects")
+        self.staging_dir = os.path.join(root, "staging")
+        self.manifest_path = os.path.join(root, "manifest.json")
+        self.refs: Dict[str, int] = {}
+        self._lock = threading.RLock()
+
+        # Anything left in staging is an interrupted write
+        shutil.rmtree(self.staging_dir, ignore_errors=True)
+        os.makedirs(self.staging_dir, exist_ok=True)
+        os.makedirs(self.objects_dir, exist_ok=True)
+        self.entries: Dict[str, Dict] = self._load_manifest()
+
+    # --- Manifest ---
+
+    def _load_manifest(self) -> Dict[str, Dict]:
+        entries: Dict[str, Dict] = {}
+        if os.path.exists(self.manifest_path):
+            try:
+                with open(self.manifest_path) as f:
+                    entries = json.load(f)
+            except (OSError, ValueError):
+                entries = {}
+        # Reconcile with what is actually on disk, ignoring anything outside the objects/<key[:2]>/<key> layout
+        on_disk = set()
+        for prefix in os.listdir(self.objects_dir):
+            prefix_dir = os.path.join(self.objects_dir, prefix)
+            if not os.path.isdir(prefix_dir):
+                continue
+            on_disk.update(key for key in os.listdir(prefix_dir) if _is_key(key) and key[:2] == prefix)
+        entries = {key: entry for key, entry in entries.items() if key in on_disk}
+        for key in on_disk - entries.keys():
+            path = self.path(key)
+            entries[key] = {"kind": "unknown", "size": _disk_size(path), "last_access": os.path.getmtime(path)}
+        return entries
+
+    def _save_manifest(self):
+        tmp_path = self.manifest_path + ".tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.entries, f)
+        os.replace(tmp_path, self.manifest_path)
+
+    # --- Reads ---
+
+    def path(self, key: str) -> str:
+        return os.path.join(self.objects_dir, key[:2], key)
+
+    def has(self, key: str) -> bool:
+        return key in self.entries
+
+    def touch(self, key: str):
+        with self._lock:
+            if key in self.entries:
+                self.entries[key]["last_access"] = time.time()
+                self._save_manifest()
+
+    def get_json(self, key: str) -> Optional[Dict]:
+        if not self.has(key):
+            return None
+        with open(self.path(key)) as f:
+            return json.load(f)
+
+    # --- Writes ---
+
+    def staging_path(self) -> str:
+        """A fresh path in the staging area, on the same filesystem as the objects"""
+        return os.path.join(self.staging_dir, uuid.uuid4().hex)
+
+    def _commit(self, key: str, kind: str, staged_path: str):
+        """Atomically move a staged file or directory into place and record it"""
+        with self._lock:
+            final_path = self.path(key)
+            if key in self.entries:
+                _remove(staged_path)  # identical content is already stored
+            else:
+                os.makedirs(os.path.dirname(final_path), exist_ok=True)
+                os.replace(staged_path, final_path)
+                self.entries[key] = {"kind": kind, "size": _disk_size(final_path)}
+            self.entries[key]["last_access"] = time.time()
+            self._save_manifest()
+        self.gc()
+
+    def put_file(self, src_path: str, kind: str, sha256: str = "", move: bool = False) -> str:
+        """Store a file under the SHA-256 of its content; returns the key"""
+        key = sha256 or file_sha256(src_path)
+        staged_path = self.staging_path()
+        if move:
+            shutil.move(src_path, staged_path)
+        else:
+            shutil.copyfile(src_path, staged_path)
+        self._commit(key, kind, staged_path)
+        return key
+
+    def put_dir(self, key: str, kind: str, writer: Callable[[str], None]):
+        """Store a directory produced by writer(staging_dir) under key"""
+        staged_path = self.staging_path()
+        writer(staged_path)
+        self._commit(key, kind, staged_path)
+
+    def put_json(self, key: str, kind: str, data: Dict):
+        staged_path = self.staging_path()
+        with open(staged_path, "w") as f:
+            json.dump(data, f)
+        self._commit(key, kind, staged_path)
+
+    # --- References and eviction ---
+
+    def acquire(self, keys: List[str]):
+        """Mark artifacts as in use so they are never evicted"""
+        with self._lock:
+            for key in keys:
+                self.refs[key] = self.refs.get(key, 0) + 1
+
+    def release(self, keys: List[str]):
+        with self._lock:
+            for key in keys:
+                if self.refs.get(key, 0) <= 1:
+                    self.refs.pop(key, None)
+                else:
+                    self.refs[key] -= 1
+        self.gc()
+
+    def total_size(self) -> int:
+        return sum(entry["size"] for entry in self.entries.values())
+
+    def gc(self) -> List[str]:
+        """Evict least recently used unreferenced artifacts until the store fits its budget"""
+        evicted = []
+        with self._lock:
+            total = self.total_size()
+            if total <= self.budget_bytes:
+                return evicted
+            cold = sorted(
+                (key for key in self.entries if key not in self.refs),
+                key=lambda key: self.entries[key]["last_access"],
+            )
+            for key in cold:
+                if total <= self.budget_bytes:
+                    break
+                _remove(self.path(key))
+                total -= self.entries.pop(key)["size"]
+                evicted.append(key)
+            if evicted:
+                self._save_manifest()
+        return evicted
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "artifacts": len(self.entries),
+                "referenced": len(self.refs),
+                "total_bytes": self.total_size(),
+                "budget_bytes": self.budget_bytes,
+            }
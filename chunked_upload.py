@@ -0,0 +1,170 @@
+"""
+Resumable uploads: create an upload, append parts at explicit offsets, then finalize.
+
+Parts are streamed straight to a file on disk, so memory use per upload stays
+constant regardless of the file size. Upload metadata is kept next to the part
+file, which lets a client query the current offset and resume after a failure.
+Finalizing only verifies the upload; its state is removed by complete() once the
+PDF has been ingested, so a failed ingestion can be retried without uploading again.
+Uploads that see no activity for ttl_seconds are removed when the next upload is
+created and at startup.
+"""
+
+import asyncio
+import json
+import os
+import threading
+import time
+import uuid
+from typing import AsyncIterator, Dict, List, Set
+
+from artifact_store import file_sha256
+
+DEFAULT_TTL_SECONDS = 24 * 60 * 60
+
+
+class UploadError(Exception):
+    """Invalid upload operation; status_code is the HTTP status to report"""
+
+    def __init__(self, status_code: int, message: str):
+        super().__init__(message)
+        self.status_code = status_code
+        self.message = message
+
+
+class ResumableUploads:
+    def __init__(self, root: str, max_size: int, ttl_seconds: int = DEFAULT_TTL_SECONDS):
+        self.root = root
+        self.max_size = max_size
+        self.ttl_seconds = ttl_seconds
+        self._locks: Dict[str, asyncio.Lock] = {}
+        # Uploads being verified or ingested; finalize runs in worker threads
+        self._finalizing: Set[str] = set()
+        self._finalizing_lock = threading.Lock()
+        os.makedirs(root, exist_ok=True)
+        self.expire()
+
+    def _paths(self, upload_id: str):
+        if not upload_id.isalnum():
+            raise UploadError(404, "Upload not found")
+        base = os.path.join(self.root, upload_id)
+        return base + ".json", base + ".part"
+
+    def create(self, filename: str, size: int, sha256: str = "") -> Dict:
+        if size <= 0 or size > self.max_size:
+            raise UploadError(400, f"Upload size must be between 1 byte and {self.max_size} bytes.")
+        self.expire()
+        upload_id = uuid.uuid4().hex
+        meta_path, part_path = self._paths(upload_id)
+        meta = {
+            "upload_id": upload_id,
+            "filename": filename,
+            "size": size,
+            "sha256": sha256.lower(),
+            "created_at": time.time(),
+        }
+        open(part_path, "wb").close()
+        with open(meta_path + ".tmp", "w") as f:
+            json.dump(meta, f)
+        os.replace(meta_path + ".tmp", meta_path)
+        return dict(meta, offset=0)
+
+    def get(self, upload_id: str) -> Dict:
+        meta_path, part_path = self._paths(upload_id)
+        if not os.path.exists(meta_path) or not os.path.exists(part_path):
+            raise UploadError(404, "Upload not found")
+        with open(meta_path) as f:
+            meta = json.load(f)
+        # The bytes on disk are the source of truth for where to resume
+        meta["offset"] = os.path.getsize(part_path)
+        return meta
+
+    async def append(self, upload_id: str, offset: int, chunks: AsyncIterator[bytes]) -> Dict:
+        """Append a part that starts at offset; rejects parts that do not continue the file"""
+        self.get(upload_id)  # unknown ids must not leave a lock behind
+        lock = self._locks.setdefault(upload_id, asyncio.Lock())
+        async with lock:
+            meta = self.get(upload_id)
+            if upload_id in self._finalizing:
+                raise UploadError(409, "Upload is being finalized")
+            if offset != meta["offset"]:
+                raise UploadError(409, f"Offset mismatch: upload is at byte {meta['offset']}")
+            _, part_path = self._paths(upload_id)
+            written = meta["offset"]
+            with open(part_path, "ab") as f:
+                async for chunk in chunks:
+                    written += len(chunk)
+                    if written > meta["size"]:
+                        f.truncate(meta["offset"])
+                        raise UploadError(400, "Part exceeds the declared upload size")
+                    f.write(chunk)
+            meta["offset"] = written
+            return meta
+
+    def finalize(self, upload_id: str, sha256: str = "") -> Dict:
+        """
+        Verify size and SHA-256 of the completed upload; returns its metadata including the part path.
+        Blocks while hashing, so call it off the event loop. Nothing is removed: follow up with
+        complete() once the upload has been consumed, or release() to allow another attempt.
+        """
+        meta = self.get(upload_id)
+        expected = (sha256 or meta["sha256"]).lower()
+        if not expected:
+            raise UploadError(400, "A sha256 checksum is required to finalize the upload")
+        if meta["offset"] != meta["size"]:
+            raise UploadError(409, f"Upload incomplete: {meta['offset']} of {meta['size']} bytes received")
+        with self._finalizing_lock:
+            if upload_id in self._finalizing:
+                raise UploadError(409, "Upload is already being finalized")
+            self._finalizing.add(upload_id)
+
+        try:
+            _, part_path = self._paths(upload_id)
+            if file_sha256(part_path) != expected:
+                raise UploadError(422, "Checksum mismatch; restart the upload")
+        except BaseException:
+            self.release(upload_id)
+            raise
+        return dict(meta, path=part_path, sha256=expected)
+
+    def release(self, upload_id: str):
+        """End a finalize attempt that did not consume the upload; it can be finalized again"""
+        with self._finalizing_lock:
+            self._finalizing.discard(upload_id)
+
+    def complete(self, upload_id: str):
+        """Remove a finalized upload whose content has been consumed"""
+        self.abort(upload_id)
+        self.release(upload_id)
+
+    def abort(self, upload_id: str):
+        meta_path, part_path = self._paths(upload_id)
+        for path in (meta_path, part_path):
+            if os.path.exists(path):
+                os.remove(path)
+        self._locks.pop(upload_id, None)
+
+    def expire(self) -> List[str]:
+        """Remove uploads whose part file has not been written to for ttl_seconds"""
+        cutoff = time.time() - self.ttl_seconds
+        expired = []
+        for name in os.listdir(self.root):
+            upload_id = name.split(".", 1)[0]
+            lock = self._locks.get(upload_id)
+            if (lock is not None and lock.locked()) or upload_id in self._finalizing:
+                continue  # a part is being appended or the upload is being finalized right now
+            path = os.path.join(self.root, name)
+            try:
+                if os.path.getmtime(path) >= cutoff:
+                    continue
+                # Metadata is only written at creation, so judge activity by the part file
+                part_path = os.path.join(self.root, upload_id + ".part")
+                if name != upload_id + ".part" and os.path.exists(part_path) and os.path.getmtime(part_path) >= cutoff:
+                    continue
+                os.remove(path)
+            except OSError:
+                continue  # removed concurrently
+            self._locks.pop(upload_id, None)
+            if upload_id not in expired:
+                expired.append(upload_id)
+        return expired
@@ -0,0 +1,153 @@
+"""
+Two-document comparison using chunk embedding similarity.
+
+Cosine similarities between the chunks of both documents are computed in blocks
+so memory stays bounded for documents with thousands of chunks. Chunks are then
+classified as matched, changed or unique, and only the divergent ones are sent
+to the LLM.
+"""
+
+from itertools import zip_longest
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+BLOCK_SIZE = 1024
+MATCH_THRESHOLD = 0.92   # at or above: same section
+CHANGE_THRESHOLD = 0.65  # between the two: same section, different content
+PROMPT_CHAR_BUDGET = 12000
+
+
+def _normalize(matrix: np.ndarray) -> np.ndarray:
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+    norms[norms == 0] = 1.0
+    return matrix / norms
+
+
+def best_matches(
+    emb_a: np.ndarray, emb_b: np.ndarray, block_size: int = BLOCK_SIZE
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Best cosine match of every row of emb_a in emb_b and vice versa.
+    The similarity matrix is only ever materialized one block_size x block_size tile at a time.
+    Returns (a_score, a_index, b_score, b_index).
+    """
+    a = _normalize(emb_a)
+    b = _normalize(emb_b)
+    a_score = np.full(len(a), -1.0, dtype=np.float32)
+    a_index = np.full(len(a), -1, dtype=np.int64)
+    b_score = np.full(len(b), -1.0, dtype=np.float32)
+    b_index = np.full(len(b), -1, dtype=np.int64)
+
+    for i in range(0, len(a), block_size):
+        a_block = a[i:i + block_size]
+        for j in range(0, len(b), block_size):
+            sim = a_block @ b[j:j + block_size].T
+
+            row_arg = sim.argmax(axis=1)
+            row_max = sim[np.arange(sim.shape[0]), row_arg]
+            better = row_max > a_score[i:i + block_size]
+            a_score[i:i + block_size][better] = row_max[better]
+            a_index[i:i + block_size][better] = row_arg[better] + j
+
+            col_arg = sim.argmax(axis=0)
+            col_max = sim[col_arg, np.arange(sim.shape[1])]
+            better = col_max > b_score[j:j + block_size]
+            b_score[j:j + block_size][better] = col_max[better]
+            b_index[j:j + block_size][better] = col_arg[better] + i
+
+    return a_score, a_index, b_score, b_index
+
+
+def classify_sections(
+    emb_a: np.ndarray,
+    emb_b: np.ndarray,
+    match_threshold: float = MATCH_THRESHOLD,
+    change_threshold: float = CHANGE_THRESHOLD,
+) -> Dict:
+    """
+    Classify chunks of two documents as matched, changed or unique.
+    changed holds (index_a, index_b, similarity) pairs sorted from most to least divergent.
+    """
+    a_score, a_index, b_score, _ = best_matches(emb_a, emb_b)
+
+    matched = int(np.count_nonzero(a_score >= match_threshold))
+    changed_mask = (a_score >= change_threshold) & (a_score < match_threshold)
+    changed = [
+        (int(i), int(a_index[i]), float(a_score[i]))
+        for i in np.flatnonzero(changed_mask)
+    ]
+    changed.sort(key=lambda pair: pair[2])
+
+    return {
+        "matched": matched,
+        "changed": changed,
+        "unique_a": [int(i) for i in np.flatnonzero(a_score < change_threshold)],
+        "unique_b": [int(i) for i in np.flatnonzero(b_score < change_threshold)],
+    }
+
+
+def build_comparison_prompt(
+    name_a: str,
+    name_b: str,
+    texts_a: List[str],
+    texts_b: List[str],
+    sections: Dict,
+    question: str = "",
+    char_budget: int = PROMPT_CHAR_BUDGET,
+) -> Tuple[str, int]:
+    """
+    Build a comparison prompt from the divergent sections only, within a character budget.
+    Returns the prompt and the number of sections left out because the budget was reached.
+    """
+    changed = [
+        f"[Changed section, similarity {score:.2f}]\n{name_a}:\n{texts_a[i]}\n{name_b}:\n{texts_b[j]}\n"
+        for i, j, score in sections["changed"]
+    ]
+    # Alternate between the two documents so neither side's unique sections crowd out the other's
+    unique_a = [f"[Only in {name_a}]\n{texts_a[i]}\n" for i in sections["unique_a"]]
+    unique_b = [f"[Only in {name_b}]\n{texts_b[i]}\n" for i in sections["unique_b"]]
+    unique = [text for pair in zip_longest(unique_a, unique_b) for text in pair if text is not None]
+
+    def take(texts: List[str], budget: int) -> List[int]:
+        """Indices of the texts that fit into budget, in priority order, skipping ones that do not fit"""
+        taken = []
+        for index, text in enumerate(texts):
+            if len(text) <= budget:
+                taken.append(index)
+                budget -= len(text)
+        return taken
+
+    def size(texts: List[str], indices: List[int]) -> int:
+        return sum(len(texts[i]) for i in indices)
+
+    # Changed sections (most divergent first) and unique sections each get half the budget,
+    # so a long list of changes cannot hide content that exists in only one document.
+    # Whatever one group leaves unused goes to the other.
+    changed_taken = take(changed, char_budget // 2 if unique else char_budget)
+    unique_taken = take(unique, char_budget - size(changed, changed_taken))
+    remaining = sorted(set(range(len(changed))) - set(changed_taken))
+    leftover = char_budget - size(changed, changed_taken) - size(unique, unique_taken)
+    changed_taken += [remaining[i] for i in take([changed[i] for i in remaining], leftover)]
+
+    parts = [changed[i] for i in sorted(changed_taken)] + [unique[i] for i in sorted(unique_taken)]
+    omitted = len(changed) + len(unique) - len(parts)
+
+    omitted_note = ""
+    if omitted:
+        omitted_note = (
+            f"{omitted} further changed or unique sections were omitted for length; "
+            "mention that the comparison is incomplete.\n"
+        )
+    task = question.strip() or "Describe the important differences between the two documents."
+    prompt = (
+        "You are an AI assistant comparing two PDF documents.\n"
+        f"'{name_a}' and '{name_b}' share {sections['matched']} matching sections, which are omitted. "
+        "Below are only the sections that changed or appear in one document only.\n"
+        + omitted_note
+        + "Base your answer strictly on these sections.\n\n"
+        + "\n".join(parts)
+        + f"\nTask: {task}\n\nAssistant:"
+    )
+    return prompt, omitted
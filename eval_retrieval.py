@@ -0,0 +1,213 @@
+"""
+Offline evaluation of chunking and retrieval settings.
+
+Builds an index of every corpus PDF for each chunk_size/chunk_overlap combination with
+the same indexing pipeline the server uses (indexing.py), then checks for each question
+at which rank the first chunk containing its answer span is retrieved. For every doc type
+and every combination of chunk size, overlap and k it reports recall@k, MRR, index build
+time, index memory, prompt tokens and search latency side by side.
+
+The corpus is a JSON file:
+    {"documents": [{"path": "contract.pdf", "type": "contract",
+                    "questions": [{"question": "...", "answer": "exact span from the PDF"}]}]}
+
+Run with:
+    python eval_retrieval.py corpus.json --chunk-sizes 200,400,800 --overlaps 0,50,100 --ks 3,5,8
+Add --apply to write the winning settings per doc type to RETRIEVAL_SETTINGS_FILE, which
+/upload?doc_type=... then uses for chunking and k. Documents without a type are evaluated
+as the "default" type, whose settings apply to uploads without a doc_type.
+
+Nothing here imports the API server, so running it next to a live deployment leaves the
+server's uploads and artifact store alone.
+"""
+
+import json
+import os
+import re
+import time
+from collections import defaultdict
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from indexing import DEFAULT_DOC_TYPE, RETRIEVAL_SETTINGS_FILE
+
+if TYPE_CHECKING:
+    import numpy as np
+
+# Prompt tokens are estimated from characters, roughly 4 per token for English text
+CHARS_PER_TOKEN = 4
+# Shorter chunks lying inside an answer span are too generic to count as a hit
+MIN_CHUNK_CHARS_IN_ANSWER = 20
+
+_query_embeddings: Dict[str, "np.ndarray"] = {}
+
+
+def normalize(text: str) -> str:
+    """Lowercase and collapse whitespace, so answer spans survive PDF line breaks"""
+    return re.sub(r"\s+", " ", text).strip().lower()
+
+
+def contains_answer(chunk: str, answer: str) -> bool:
+    """A chunk holds the answer if it contains the span, or lies inside a span longer than itself"""
+    return answer in chunk or (len(chunk) >= MIN_CHUNK_CHARS_IN_ANSWER and chunk in answer)
+
+
+def answer_rank(chunks: List[str], answer: str) -> Optional[int]:
+    """1-based rank of the first chunk that holds the answer, None if none does"""
+    for rank, chunk in enumerate(chunks, start=1):
+        if contains_answer(chunk, answer):
+            return rank
+    return None
+
+
+def embed_query(question: str):
+    """Embed a question once; every chunking setting is searched with the same vector"""
+    import numpy as np
+    from indexing import get_embedding_model
+
+    if question not in _query_embeddings:
+        _query_embeddings[question] = np.asarray(get_embedding_model().embed_query(question), dtype=np.float32)
+    return _query_embeddings[question]
+
+
+def evaluate_document(document: Dict, chunk_size: int, chunk_overlap: int, ks: List[int]) -> Dict:
+    """Index one document with the given chunking and score its questions for every k"""
+    from indexing import build_vector_store
+    from residency import estimate_store_bytes
+
+    started = time.perf_counter()
+    vector_store = build_vector_store(document["path"], chunk_size, chunk_overlap)
+    build_seconds = time.perf_counter() - started
+    index_bytes = estimate_store_bytes(vector_store)
+
+    max_k = min(max(ks), vector_store.index.ntotal)
+    questions = []
+    for qa in document["questions"]:
+        query_embedding = embed_query(qa["question"])
+        started = time.perf_counter()
+        _, indices = vector_store.index.search(query_embedding.reshape(1, -1), max_k)
+        search_seconds = time.perf_counter() - started
+        chunks = [
+            vector_store.docstore.search(vector_store.index_to_docstore_id[i]).page_content
+            for i in indices[0] if i != -1
+        ]
+        questions.append({
+            "rank": answer_rank([normalize(c) for c in chunks], normalize(qa["answer"])),
+            "chunk_chars": [len(c) for c in chunks],
+            "search_seconds": search_seconds,
+        })
+
+    return {
+        "chunks": vector_store.index.ntotal,
+        "build_seconds": build_seconds,
+        "index_bytes": index_bytes,
+        "questions": questions,
+    }
+
+
+def summarize_results(results: List[Dict], k: int) -> Dict:
+    """Pool the questions of several documents into the metrics for one k"""
+    questions = [q for result in results for q in result["questions"]]
+    n = len(questions) or 1
+    hits = [q["rank"] for q in questions if q["rank"] is not None and q["rank"] <= k]
+    return {
+        "recall": len(hits) / n,
+        "mrr": sum(1.0 / rank for rank in hits) / n,
+        "prompt_tokens": sum(sum(q["chunk_chars"][:k]) for q in questions) / n / CHARS_PER_TOKEN,
+        "search_ms": sum(q["search_seconds"] for q in questions) / n * 1000,
+        "build_seconds": sum(r["build_seconds"] for r in results),
+        "index_mb": sum(r["index_bytes"] for r in results) / (1024 * 1024),
+        "chunks": sum(r["chunks"] for r in results),
+        "questions": len(questions),
+    }
+
+
+def run_grid(
+    documents: List[Dict], chunk_sizes: List[int], overlaps: List[int], ks: List[int]
+) -> Dict[str, List[Dict]]:
+    """Rows of metrics per doc type, one per chunk_size/chunk_overlap/k combination"""
+    rows: Dict[str, List[Dict]] = defaultdict(list)
+    for chunk_size in chunk_sizes:
+        for chunk_overlap in overlaps:
+            if chunk_overlap >= chunk_size:
+                continue
+            by_type: Dict[str, List[Dict]] = defaultdict(list)
+            for document in documents:
+                result = evaluate_document(document, chunk_size, chunk_overlap, ks)
+                by_type[document.get("type") or DEFAULT_DOC_TYPE].append(result)
+            for doc_type, results in by_type.items():
+                for k in ks:
+                    rows[doc_type].append(dict(
+                        summarize_results(results, k), chunk_size=chunk_size, chunk_overlap=chunk_overlap, k=k
+                    ))
+    return rows
+
+
+def pick_winner(rows: List[Dict], recall_tolerance: float) -> Dict:
+    """Cheapest settings whose recall is within recall_tolerance of the best recall"""
+    best_recall = max(row["recall"] for row in rows)
+    candidates = [row for row in rows if row["recall"] >= best_recall - recall_tolerance]
+    return min(candidates, key=lambda row: (row["prompt_tokens"], -row["mrr"], row["index_mb"]))
+
+
+def print_table(doc_type: str, rows: List[Dict], winner: Dict):
+    print(f"\n== {doc_type} ({rows[0]['questions']} questions) ==")
+    print(f"{'size':>6} {'overlap':>7} {'k':>3} {'recall@k':>9} {'MRR':>6} {'build s':>8} "
+          f"{'index MB':>9} {'chunks':>7} {'prompt tok':>10} {'search ms':>9}")
+    for row in rows:
+        marker = "  <- winner" if row is winner else ""
+        print(f"{row['chunk_size']:>6} {row['chunk_overlap']:>7} {row['k']:>3} {row['recall']:>9.3f} "
+              f"{row['mrr']:>6.3f} {row['build_seconds']:>8.2f} {row['index_mb']:>9.2f} {row['chunks']:>7} "
+              f"{row['prompt_tokens']:>10.0f} {row['search_ms']:>9.3f}{marker}")
+
+
+def apply_settings(winners: Dict[str, Dict], settings_file: str):
+    """Merge the winning settings per doc type into the server's retrieval settings file"""
+    settings = {}
+    if os.path.exists(settings_file):
+        with open(settings_file, "r") as f:
+            settings = json.load(f)
+    for doc_type, row in winners.items():
+        settings[doc_type] = {
+            "chunk_size": row["chunk_size"],
+            "chunk_overlap": row["chunk_overlap"],
+            "k": row["k"],
+        }
+    tmp_path = settings_file + ".tmp"
+    with open(tmp_path, "w") as f:
+        json.dump(settings, f, indent=2)
+    os.replace(tmp_path, settings_file)
+
+
+def _int_list(value: str) -> List[int]:
+    return [int(v) for v in value.split(",") if v.strip()]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sweep chunk size, overlap and k against a question/answer corpus")
+    parser.add_argument("corpus", help="JSON file with documents, their type and question/answer pairs")
+    parser.add_argument("--chunk-sizes", type=_int_list, default=[200, 400, 800])
+    parser.add_argument("--overlaps", type=_int_list, default=[0, 50, 100])
+    parser.add_argument("--ks", type=_int_list, default=[3, 5, 8])
+    parser.add_argument("--recall-tolerance", type=float, default=0.02,
+                        help="recall a cheaper setting may give up against the best one")
+    parser.add_argument("--output", help="write all rows and winners as JSON")
+    parser.add_argument("--apply", action="store_true", help="write the winners to RETRIEVAL_SETTINGS_FILE")
+    args = parser.parse_args()
+
+    with open(args.corpus, "r") as f:
+        corpus = json.load(f)
+
+    rows_by_type = run_grid(corpus["documents"], args.chunk_sizes, args.overlaps, args.ks)
+    winners = {}
+    for doc_type, rows in rows_by_type.items():
+        winners[doc_type] = pick_winner(rows, args.recall_tolerance)
+        print_table(doc_type, rows, winners[doc_type])
+
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump({"rows": rows_by_type, "winners": winners}, f, indent=2)
+    if args.apply:
+        apply_settings(winners, RETRIEVAL_SETTINGS_FILE)
+        print(f"\nWrote settings for {', '.join(winners)} to {RETRIEVAL_SETTINGS_FILE}")
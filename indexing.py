@@ -0,0 +1,97 @@
+"""
+Building FAISS indexes from PDFs: embedding model selection, chunking settings and the
+parse/split/embed pipeline.
+
+Kept free of server state (artifact store, upload folders, sessions) so offline tools
+such as eval_retrieval.py can build indexes exactly like the server without touching
+a running deployment's files.
+"""
+
+import json
+import os
+import threading
+from typing import TYPE_CHECKING, Dict, List, Optional
+
+from profiling import profile_stage
+
+if TYPE_CHECKING:
+    from langchain_core.documents import Document
+    from langchain_community.vectorstores import FAISS
+
+CHUNK_SIZE = 400
+CHUNK_OVERLAP = 50
+
+# Per-document-type chunking and k, as chosen by eval_retrieval.py --apply
+RETRIEVAL_SETTINGS_FILE = os.environ.get("RETRIEVAL_SETTINGS_FILE", "retrieval_settings.json")
+# Settings entry used for documents uploaded without a doc_type
+DEFAULT_DOC_TYPE = "default"
+
+EMBEDDING_MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+# "torch" (sentence-transformers), "onnx" or "onnx-int8" (ONNX Runtime, see onnx_embeddings.py)
+EMBEDDING_BACKEND = os.environ.get("EMBEDDING_BACKEND", "torch")
+# Intra/inter-op threads for the ONNX backend; 0 lets the runtime decide
+EMBEDDING_INTRA_OP_THREADS = int(os.environ.get("EMBEDDING_INTRA_OP_THREADS", "0"))
+EMBEDDING_INTER_OP_THREADS = int(os.environ.get("EMBEDDING_INTER_OP_THREADS", "0"))
+
+_embedding_model = None
+_embedding_model_lock = threading.Lock()
+
+
+def get_embedding_model():
+    """Return the shared embedding model, loading it on first use"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_model_lock:
+            if _embedding_model is None:
+                if EMBEDDING_BACKEND in ("onnx", "onnx-int8"):
+                    from onnx_embeddings import OnnxMiniLMEmbeddings
+
+                    _embedding_model = OnnxMiniLMEmbeddings(
+                        model_name=EMBEDDING_MODEL_NAME,
+                        quantize=EMBEDDING_BACKEND == "onnx-int8",
+                        intra_op_threads=EMBEDDING_INTRA_OP_THREADS,
+                        inter_op_threads=EMBEDDING_INTER_OP_THREADS,
+                    )
+                elif EMBEDDING_BACKEND == "torch":
+                    from langchain_huggingface import HuggingFaceEmbeddings
+
+                    _embedding_model = HuggingFaceEmbeddings(model_name=EMBEDDING_MODEL_NAME)
+                else:
+                    raise ValueError(f"Unknown EMBEDDING_BACKEND: {EMBEDDING_BACKEND}")
+    return _embedding_model
+
+
+def load_retrieval_settings(doc_type: Optional[str]) -> Dict:
+    """
+    Chunking and retrieval settings for a document type from RETRIEVAL_SETTINGS_FILE;
+    untyped documents use the DEFAULT_DOC_TYPE entry. Missing values fall back to the
+    defaults; k is None when the endpoint default applies.
+    """
+    settings = {"chunk_size": CHUNK_SIZE, "chunk_overlap": CHUNK_OVERLAP, "k": None}
+    if os.path.exists(RETRIEVAL_SETTINGS_FILE):
+        with open(RETRIEVAL_SETTINGS_FILE, "r") as f:
+            settings.update(json.load(f).get(doc_type or DEFAULT_DOC_TYPE, {}))
+    return settings
+
+
+def split_pdf(pdf_path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> List["Document"]:
+    """Load a PDF and chunk its text into the documents that get embedded"""
+    from langchain_community.document_loaders import PyMuPDFLoader
+    from langchain.text_splitter import RecursiveCharacterTextSplitter
+
+    with profile_stage("parse"):
+        loader = PyMuPDFLoader(pdf_path)
+        documents = loader.load()
+    with profile_stage("split"):
+        splitter = RecursiveCharacterTextSplitter(chunk_size=chunk_size, chunk_overlap=chunk_overlap)
+        return splitter.split_documents(documents)
+
+
+def build_vector_store(pdf_path: str, chunk_size: int = CHUNK_SIZE, chunk_overlap: int = CHUNK_OVERLAP) -> "FAISS":
+    """Load a PDF, chunk its text and embed the chunks into a FAISS index"""
+    from langchain_community.vectorstores import FAISS
+
+    chunks = split_pdf(pdf_path, chunk_size, chunk_overlap)
+    with profile_stage("embed"):
+        return FAISS.from_documents(chunks, get_embedding_model())
@@ -0,0 +1,187 @@
+"""
+ONNX Runtime embedding backend for sentence-transformers/all-MiniLM-L6-v2.
+
+Runs the same model as HuggingFaceEmbeddings on CPU through ONNX Runtime, optionally
+with int8 dynamic quantization. The model is exported once and cached on disk.
+
+Check parity and throughput against the PyTorch path with:
+    python onnx_embeddings.py --pdf some.pdf --quantize
+"""
+
+import os
+import time
+from typing import Dict, List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+MODEL_CACHE_DIR = "./onnx_models"
+MAX_SEQ_LENGTH = 256  # matches the sentence-transformers config of all-MiniLM-L6-v2
+BATCH_SIZE = 64
+
+# Minimum cosine similarity to the PyTorch vectors for a backend to pass the parity check
+PARITY_MIN_COSINE = {"onnx": 0.9999, "onnx-int8": 0.98}
+
+
+def export_onnx(model_name: str = MODEL_NAME, cache_dir: str = MODEL_CACHE_DIR, quantize: bool = False) -> str:
+    """Export the transformer to ONNX (and optionally quantize it to int8); returns the model directory"""
+    model_dir = os.path.join(cache_dir, model_name.replace("/", "__"))
+    fp32_path = os.path.join(model_dir, "model.onnx")
+    int8_path = os.path.join(model_dir, "model.int8.onnx")
+
+    if not os.path.exists(fp32_path):
+        import torch
+        from transformers import AutoModel, AutoTokenizer
+
+        os.makedirs(model_dir, exist_ok=True)
+        tokenizer = AutoTokenizer.from_pretrained(model_name)
+        model = AutoModel.from_pretrained(model_name).eval()
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        tmp_path = fp32_path + ".tmp"
+        with torch.no_grad():
+            torch.onnx.export(
+                model,
+                (sample["input_ids"], sample["attention_mask"], sample["token_type_ids"]),
+                tmp_path,
+                input_names=["input_ids", "attention_mask", "token_type_ids"],
+                output_names=["last_hidden_state"],
+                dynamic_axes={
+                    "input_ids": {0: "batch", 1: "sequence"},
+                    "attention_mask": {0: "batch", 1: "sequence"},
+                    "token_type_ids": {0: "batch", 1: "sequence"},
+                    "last_hidden_state": {0: "batch", 1: "sequence"},
+                },
+                opset_version=14,
+            )
+        tokenizer.save_pretrained(model_dir)
+        os.replace(tmp_path, fp32_path)
+
+    if quantize and not os.path.exists(int8_path):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        tmp_path = int8_path + ".tmp"
+        quantize_dynamic(fp32_path, tmp_path, weight_type=QuantType.QInt8)
+        os.replace(tmp_path, int8_path)
+
+    return model_dir
+
+
+class OnnxMiniLMEmbeddings(Embeddings):
+    """Mean-pooled, L2-normalized sentence embeddings computed with ONNX Runtime"""
+
+    def __init__(
+        self,
+        model_name: str = MODEL_NAME,
+        quantize: bool = False,
+        intra_op_threads: int = 0,
+        inter_op_threads: int = 0,
+        batch_size: int = BATCH_SIZE,
+        cache_dir: str = MODEL_CACHE_DIR,
+    ):
+        import onnxruntime as ort
+        from transformers import AutoTokenizer
+
+        model_dir = export_onnx(model_name, cache_dir, quantize)
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        # 0 lets ONNX Runtime pick one thread per physical core
+        options.intra_op_num_threads = intra_op_threads
+        if inter_op_threads:
+            # The inter-op pool only runs independent graph nodes in parallel mode
+            options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+            options.inter_op_num_threads = inter_op_threads
+        else:
+            options.execution_mode = ort.ExecutionMode.ORT_SEQUENTIAL
+
+        model_file = "model.int8.onnx" if quantize else "model.onnx"
+        self.session = ort.InferenceSession(
+            os.path.join(model_dir, model_file), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self.batch_size = batch_size
+
+    def _embed(self, texts: List[str]) -> np.ndarray:
+        if not texts:
+            return np.zeros((0, 384), dtype=np.float32)
+        # Batch texts of similar length together to minimize padding
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        result = [None] * len(texts)
+        for start in range(0, len(order), self.batch_size):
+            batch_ids = order[start:start + self.batch_size]
+            encoded = self.tokenizer(
+                [texts[i] for i in batch_ids],
+                padding=True,
+                truncation=True,
+                max_length=MAX_SEQ_LENGTH,
+                return_tensors="np",
+            )
+            feed = {k: v.astype(np.int64) for k, v in encoded.items() if k in self.input_names}
+            hidden = self.session.run(None, feed)[0]
+
+            mask = encoded["attention_mask"][..., None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            pooled /= np.clip(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12, None)
+            for row, i in enumerate(batch_ids):
+                result[i] = pooled[row]
+        return np.vstack(result).astype(np.float32)
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        return self._embed(texts).tolist()
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._embed([text])[0].tolist()
+
+
+def check_parity(reference: Embeddings, candidate: Embeddings, texts: List[str], min_cosine: float) -> Dict:
+    """Compare candidate vectors with the reference backend on the same texts"""
+    ref = np.asarray(reference.embed_documents(texts), dtype=np.float32)
+    cand = np.asarray(candidate.embed_documents(texts), dtype=np.float32)
+    cosine = (ref * cand).sum(axis=1) / (
+        np.linalg.norm(ref, axis=1) * np.linalg.norm(cand, axis=1)
+    )
+    return {
+        "texts": len(texts),
+        "max_abs_diff": float(np.abs(ref - cand).max()),
+        "min_cosine": float(cosine.min()),
+        "mean_cosine": float(cosine.mean()),
+        "passed": bool(cosine.min() >= min_cosine),
+    }
+
+
+def measure_throughput(embeddings: Embeddings, texts: List[str]) -> float:
+    """Chunks embedded per second"""
+    embeddings.embed_documents(texts[:8])  # warm up
+    started = time.perf_counter()
+    embeddings.embed_documents(texts)
+    return len(texts) / (time.perf_counter() - started)
+
+
+def _load_pdf_chunks(pdf_path: str) -> List[str]:
+    """The chunk texts the server embeds for this PDF, with its default chunking"""
+    from indexing import split_pdf
+
+    return [c.page_content for c in split_pdf(pdf_path)]
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from langchain_huggingface import HuggingFaceEmbeddings
+
+    parser = argparse.ArgumentParser(description="Parity and throughput of the ONNX embedding backend")
+    parser.add_argument("--pdf", required=True, help="PDF whose chunks are embedded")
+    parser.add_argument("--quantize", action="store_true", help="use int8 dynamic quantization")
+    parser.add_argument("--threads", type=int, default=0, help="intra-op threads (0 = auto)")
+    args = parser.parse_args()
+
+    chunks = _load_pdf_chunks(args.pdf)
+    backend = "onnx-int8" if args.quantize else "onnx"
+    torch_embeddings = HuggingFaceEmbeddings(model_name=MODEL_NAME)
+    onnx_embeddings = OnnxMiniLMEmbeddings(quantize=args.quantize, intra_op_threads=args.threads)
+
+    parity = check_parity(torch_embeddings, onnx_embeddings, chunks[:256], PARITY_MIN_COSINE[backend])
+    print(f"Parity ({backend} vs torch): {parity}")
+    print(f"torch:   {measure_throughput(torch_embeddings, chunks):.1f} chunks/sec")
+    print(f"{backend}: {measure_throughput(onnx_embeddings, chunks):.1f} chunks/sec")
@@ -0,0 +1,250 @@
+"""
+Opt-in profiling of single requests and tracemalloc memory snapshots.
+
+A RequestProfile samples stacks at a fixed interval and records how long each
+named stage (parse, split, embed, retrieve, upstream) took. It samples the event
+loop thread for the whole request, and worker threads while they run one of the
+request's stages or its streamed upstream iterator. Every stack is rooted at the
+thread it was sampled on; event loop samples also include concurrent requests.
+The report lists stage timings, the hottest stacks, and all sampled stacks in
+collapsed format (one "frame;frame;frame count" per line), which flame graph
+tools accept directly.
+"""
+
+import sys
+import threading
+import time
+import tracemalloc
+import uuid
+from collections import Counter, OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from typing import Dict, Iterator, List, Optional, TypeVar
+
+SAMPLE_INTERVAL = 0.005
+MAX_STACK_DEPTH = 64
+TOP_STACKS = 25
+
+_current_profile: ContextVar[Optional["RequestProfile"]] = ContextVar("current_profile", default=None)
+
+T = TypeVar("T")
+
+
+def _collapse(frame) -> str:
+    frames = []
+    while frame is not None and len(frames) < MAX_STACK_DEPTH:
+        code = frame.f_code
+        frames.append(f"{code.co_name} ({code.co_filename.rsplit('/', 1)[-1]}:{frame.f_lineno})")
+        frame = frame.f_back
+    return ";".join(reversed(frames))
+
+
+class RequestProfile:
+    def __init__(self, label: str, interval: float = SAMPLE_INTERVAL):
+        self.id = uuid.uuid4().hex
+        self.label = label
+        self.interval = interval
+        self.started_at = datetime.now()
+        self.duration: Optional[float] = None
+        self.stages: List[Dict] = []
+        self.samples: Counter = Counter()
+        self._started = time.perf_counter()
+        self._loop_thread_id = threading.get_ident()
+        # Thread ident -> number of stages currently running on it for this request
+        self._threads: Counter = Counter({self._loop_thread_id: 1})
+        self._thread_names: Dict[int, str] = {self._loop_thread_id: "event loop (all requests)"}
+        self._threads_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._sampler = threading.Thread(target=self._sample, name="request-profiler", daemon=True)
+
+    def _sample(self):
+        while not self._stop.wait(self.interval):
+            frames = sys._current_frames()
+            with self._threads_lock:
+                threads = [(ident, self._thread_names[ident]) for ident in self._threads]
+            for ident, name in threads:
+                frame = frames.get(ident)
+                if frame is not None:
+                    self.samples[f"[{name}];{_collapse(frame)}"] += 1
+
+    @contextmanager
+    def on_current_thread(self):
+        """Sample the calling thread too while the block runs"""
+        ident = threading.get_ident()
+        with self._threads_lock:
+            self._threads[ident] += 1
+            self._thread_names.setdefault(ident, f"worker {threading.current_thread().name}")
+        try:
+            yield
+        finally:
+            with self._threads_lock:
+                self._threads[ident] -= 1
+                if self._threads[ident] <= 0:
+                    del self._threads[ident]
+
+    def start(self):
+        self._sampler.start()
+
+    def stop(self):
+        if self.duration is None:
+            self._stop.set()
+            self.duration = time.perf_counter() - self._started
+
+    def record_stage(self, name: str, started: float, duration: float):
+        self.stages.append({"stage": name, "start": started - self._started, "duration": duration})
+
+    def report(self) -> str:
+        total_samples = sum(self.samples.values())
+        lines = [
+            f"Profile {self.id}: {self.label}",
+            f"Started {self.started_at.isoformat()}, took {self.duration or 0:.3f}s, "
+            f"{total_samples} samples every {self.interval * 1000:.0f}ms",
+            "Stacks are rooted at their thread; event loop samples include all concurrent requests,",
+            "worker samples only cover this request's stages.",
+            "",
+            "Stages:",
+        ]
+        for stage in self.stages:
+            lines.append(f"  {stage['stage']:<12} at {stage['start']:8.3f}s  took {stage['duration']:8.3f}s")
+        lines += ["", f"Top {TOP_STACKS} stacks:"]
+        for stack, count in self.samples.most_common(TOP_STACKS):
+            lines.append(f"  {count / total_samples:6.1%}  {stack.rsplit(';', 1)[-1]}")
+            lines.append(f"          {stack}")
+        lines += ["", "Collapsed stacks:"]
+        lines += [f"{stack} {count}" for stack, count in self.samples.most_common()]
+        return "\n".join(lines) + "\n"
+
+
+def begin_profile(profile: RequestProfile):
+    """Make profile the active profile of the current context and start sampling"""
+    profile.start()
+    return _current_profile.set(profile)
+
+
+def end_profile(token):
+    _current_profile.reset(token)
+
+
+@contextmanager
+def profile_stage(name: str):
+    """Time a stage of the current request if it is being profiled; no-op otherwise"""
+    profile = _current_profile.get()
+    if profile is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        with profile.on_current_thread():
+            yield
+    finally:
+        profile.record_stage(name, started, time.perf_counter() - started)
+
+
+def profile_iterator(iterator: Iterator[T]) -> Iterator[T]:
+    """
+    Sample whichever thread advances iterator, for iterators consumed through the
+    threadpool (e.g. a streamed upstream); returns iterator unchanged if not profiling.
+    """
+    profile = _current_profile.get()
+    if profile is None:
+        return iterator
+
+    def sampled() -> Iterator[T]:
+        while True:
+            with profile.on_current_thread():
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    return sampled()
+
+
+class ProfileStore:
+    """Keeps the most recent profiles so their reports can be downloaded"""
+
+    def __init__(self, max_profiles: int = 50):
+        self.max_profiles = max_profiles
+        self._profiles: "OrderedDict[str, RequestProfile]" = OrderedDict()
+
+    def add(self, profile: RequestProfile):
+        self._profiles[profile.id] = profile
+        while len(self._profiles) > self.max_profiles:
+            self._profiles.popitem(last=False)
+
+    def get(self, profile_id: str) -> Optional[RequestProfile]:
+        return self._profiles.get(profile_id)
+
+    def list(self) -> List[Dict]:
+        return [
+            {
+                "id": p.id,
+                "label": p.label,
+                "started_at": p.started_at.isoformat(),
+                "duration": p.duration,
+                "complete": p.duration is not None,
+            }
+            for p in reversed(self._profiles.values())
+        ]
+
+
+class MemorySnapshots:
+    """tracemalloc snapshots that can be diffed to locate memory growth"""
+
+    def __init__(self, max_snapshots: int = 10, traceback_frames: int = 10):
+        self.max_snapshots = max_snapshots
+        self.traceback_frames = traceback_frames
+        self._snapshots: "OrderedDict[str, Dict]" = OrderedDict()
+
+    def take(self, state: Dict) -> Dict:
+        """Snapshot traced allocations; state records application-level sizes at the same moment"""
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(self.traceback_frames)
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        info = {
+            "id": uuid.uuid4().hex,
+            "taken_at": datetime.now().isoformat(),
+            "traced_bytes": current,
+            "peak_traced_bytes": peak,
+            "state": state,
+        }
+        self._snapshots[info["id"]] = dict(info, snapshot=snapshot)
+        while len(self._snapshots) > self.max_snapshots:
+            self._snapshots.popitem(last=False)
+        return info
+
+    def list(self) -> List[Dict]:
+        return [{k: v for k, v in s.items() if k != "snapshot"} for s in self._snapshots.values()]
+
+    def diff(self, base_id: str, target_id: str, limit: int = 20, group_by: str = "lineno") -> Dict:
+        """Largest allocation changes between two snapshots; raises KeyError for unknown ids"""
+        base = self._snapshots[base_id]
+        target = self._snapshots[target_id]
+        stats = target["snapshot"].compare_to(base["snapshot"], group_by)
+        return {
+            "base": base_id,
+            "target": target_id,
+            "traced_bytes_diff": target["traced_bytes"] - base["traced_bytes"],
+            "state_before": base["state"],
+            "state_after": target["state"],
+            "top_allocations": [
+                {
+                    "location": str(stat.traceback[0]) if group_by != "traceback" else stat.traceback.format(),
+                    "size_diff": stat.size_diff,
+                    "size": stat.size,
+                    "count_diff": stat.count_diff,
+                }
+                for stat in stats[:limit]
+            ],
+        }
+
+    def clear(self):
+        self._snapshots.clear()
+        if tracemalloc.is_tracing():
+            tracemalloc.stop()
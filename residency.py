@@ -0,0 +1,159 @@
+"""
+Memory-budgeted residency for FAISS vector stores.
+
+TieredVectorStores behaves like the plain filename -> store dict it replaces, but only
+keeps the most recently used stores in memory. When the estimated size of the resident
+stores exceeds the budget, the least recently used ones are dropped from memory; their
+on-disk form stays in the artifact store and is loaded again on the next access.
+Concurrent accesses to the same demoted store share a single reload.
+"""
+
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Optional, Set
+
+# Rough per-chunk cost of the docstore: Document object, metadata dict and id mappings
+DOCSTORE_OVERHEAD_BYTES = 600
+
+
+def estimate_store_bytes(store) -> int:
+    """Approximate memory held by a FAISS store: raw vectors plus chunk texts"""
+    index = store.index
+    text_bytes = sum(
+        len(store.docstore.search(doc_id).page_content) + DOCSTORE_OVERHEAD_BYTES
+        for doc_id in store.index_to_docstore_id.values()
+    )
+    return index.ntotal * index.d * 4 + text_bytes
+
+
+class TieredVectorStores:
+    def __init__(
+        self,
+        budget_bytes: int,
+        loader: Callable[[str], Any],
+        can_demote: Callable[[str], bool],
+        sizer: Callable[[Any], int] = estimate_store_bytes,
+    ):
+        self.budget_bytes = budget_bytes
+        self._loader = loader
+        self._can_demote = can_demote
+        self._sizer = sizer
+        self._resident: "OrderedDict[str, Any]" = OrderedDict()
+        self._sizes: Dict[str, int] = {}
+        self._known: Set[str] = set()
+        self._loading: Dict[str, Future] = {}
+        self._lock = threading.RLock()
+        self.hits = 0
+        self.reloads = 0
+        self.demotions = 0
+
+    # --- dict interface ---
+
+    def __contains__(self, filename: str) -> bool:
+        return filename in self._known
+
+    def __len__(self) -> int:
+        return len(self._known)
+
+    def keys(self) -> List[str]:
+        return list(self._known)
+
+    def __setitem__(self, filename: str, store: Any):
+        size = self._sizer(store)
+        with self._lock:
+            self._known.add(filename)
+            self._install(filename, store, size)
+
+    def __getitem__(self, filename: str) -> Any:
+        with self._lock:
+            if filename in self._resident:
+                self._resident.move_to_end(filename)
+                self.hits += 1
+                return self._resident[filename]
+            if filename not in self._known:
+                raise KeyError(filename)
+            future = self._loading.get(filename)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._loading[filename] = future
+        if not owner:
+            return future.result()
+
+        try:
+            store = self._loader(filename)
+            size = self._sizer(store)
+        except BaseException as e:
+            with self._lock:
+                self._loading.pop(filename, None)
+            future.set_exception(e)
+            raise
+        with self._lock:
+            self._loading.pop(filename, None)
+            self.reloads += 1
+            # Do not resurrect a document deleted while it was loading
+            if filename in self._known:
+                self._install(filename, store, size)
+        future.set_result(store)
+        return store
+
+    def get(self, filename: str, default: Optional[Any] = None) -> Any:
+        try:
+            return self[filename]
+        except KeyError:
+            return default
+
+    def pop(self, filename: str, default: Optional[Any] = None) -> Any:
+        with self._lock:
+            self._known.discard(filename)
+            self._sizes.pop(filename, None)
+            return self._resident.pop(filename, default)
+
+    # --- residency ---
+
+    def _install(self, filename: str, store: Any, size: int):
+        self._resident[filename] = store
+        self._resident.move_to_end(filename)
+        self._sizes[filename] = size
+        self._enforce_budget(keep=filename)
+
+    def _enforce_budget(self, keep: str):
+        """Demote least recently used stores until the resident set fits the budget"""
+        total = sum(self._sizes.values())
+        for filename in list(self._resident):
+            if total <= self.budget_bytes:
+                break
+            if filename == keep or not self._can_demote(filename):
+                continue
+            del self._resident[filename]
+            total -= self._sizes.pop(filename)
+            self.demotions += 1
+
+    def get_resident(self, filename: str) -> Optional[Any]:
+        """The store if it is in memory, else None; never loads"""
+        with self._lock:
+            store = self._resident.get(filename)
+            if store is not None:
+                self._resident.move_to_end(filename)
+                self.hits += 1
+            return store
+
+    def is_resident(self, filename: str) -> bool:
+        return filename in self._resident
+
+    def resident_stores(self) -> List[Any]:
+        with self._lock:
+            return list(self._resident.values())
+
+    def stats(self) -> Dict:
+        with self._lock:
+            return {
+                "documents": len(self._known),
+                "resident": len(self._resident),
+                "resident_bytes": sum(self._sizes.values()),
+                "budget_bytes": self.budget_bytes,
+                "hits": self.hits,
+                "reloads": self.reloads,
+                "demotions": self.demotions,
+            }
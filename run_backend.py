@@ -3,6 +3,7 @@
 Simple script to run the backend server
 """
 
+import importlib.util
 import subprocess
 import sys
 import os
@@ -22,9 +23,8 @@ def check_dependencies():
     
     missing = []
     for package in required_packages:
-        try:
-            __import__(package)
-        except ImportError:
+        # Only locate the package; importing torch & co. here would double startup time
+        if importlib.util.find_spec(package) is None:
             missing.append(package)
     
     if missing:
@@ -0,0 +1,118 @@
+"""
+Response encoding for the hot endpoints: fast JSON, compression of large bodies,
+and coalescing of small streamed chunks into fewer SSE frames.
+"""
+
+import asyncio
+import gzip
+import json
+from typing import Any, AsyncIterator, List, Optional, Set, Tuple
+
+from starlette.responses import Response
+
+try:
+    import orjson
+except ImportError:  # fall back to the standard library encoder
+    orjson = None
+
+try:
+    import brotli
+except ImportError:  # br is only offered when the brotli package is installed
+    brotli = None
+
+COMPRESS_MIN_BYTES = 1024
+GZIP_LEVEL = 5
+BROTLI_QUALITY = 4
+
+
+def dumps(content: Any) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(content)
+    return json.dumps(content, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def sse_event(content: Any) -> str:
+    return f"data: {dumps(content).decode('utf-8')}\n\n"
+
+
+def _accepted_encodings(accept_encoding: str) -> Set[str]:
+    """Encodings from an Accept-Encoding header, without those refused with q=0"""
+    accepted = set()
+    for token in accept_encoding.split(","):
+        name, *params = [part.strip() for part in token.split(";")]
+        quality = 1.0
+        for param in params:
+            key, _, value = param.partition("=")
+            if key.strip().lower() == "q":
+                try:
+                    quality = float(value.strip())
+                except ValueError:
+                    quality = 0.0
+        if name and quality > 0:
+            accepted.add(name.lower())
+    return accepted
+
+
+def compress_body(body: bytes, accept_encoding: str) -> Tuple[bytes, Optional[str]]:
+    """Compress with br or gzip if the body is large enough and the client accepts it"""
+    if len(body) < COMPRESS_MIN_BYTES:
+        return body, None
+    accepted = _accepted_encodings(accept_encoding)
+    if brotli is not None and "br" in accepted:
+        return brotli.compress(body, quality=BROTLI_QUALITY), "br"
+    if "gzip" in accepted:
+        return gzip.compress(body, compresslevel=GZIP_LEVEL), "gzip"
+    return body, None
+
+
+def json_response(content: Any, accept_encoding: str = "", status_code: int = 200) -> Response:
+    """JSON response encoded with orjson and compressed when worthwhile"""
+    body, encoding = compress_body(dumps(content), accept_encoding)
+    headers = {"Vary": "Accept-Encoding"}
+    if encoding:
+        headers["Content-Encoding"] = encoding
+    return Response(content=body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+async def coalesce_chunks(
+    chunks: AsyncIterator[str], max_delay: float, max_chars: int
+) -> AsyncIterator[str]:
+    """
+    Merge consecutive text chunks, emitting once max_chars are buffered or max_delay
+    seconds have passed since the first buffered chunk, whichever comes first.
+    """
+    loop = asyncio.get_running_loop()
+    iterator = chunks.__aiter__()
+    buffer: List[str] = []
+    size = 0
+    deadline: Optional[float] = None
+    pending: Optional[asyncio.Future] = None
+    try:
+        while True:
+            if pending is None:
+                pending = asyncio.ensure_future(iterator.__anext__())
+            timeout = None if deadline is None else max(0.0, deadline - loop.time())
+            done, _ = await asyncio.wait({pending}, timeout=timeout)
+            if not done:
+                # Time window elapsed while waiting for the next chunk
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+                continue
+
+            finished, pending = pending, None
+            try:
+                chunk = finished.result()
+            except StopAsyncIteration:
+                break
+            if not buffer:
+                deadline = loop.time() + max_delay
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= max_chars:
+                yield "".join(buffer)
+                buffer, size, deadline = [], 0, None
+    finally:
+        if pending is not None:
+            pending.cancel()
+    if buffer:
+        yield "".join(buffer)
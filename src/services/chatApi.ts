@@ -1,5 +1,9 @@
 const API_BASE_URL = 'http://localhost:8000';
 
+// Files above this size are sent through the resumable upload API in parts
+const RESUMABLE_UPLOAD_THRESHOLD = 8 * 1024 * 1024;
+const MAX_PART_RETRIES = 5;
+
 export interface ChatMessageRequest {
   message: string;
   sessionId: string;
@@ -21,6 +25,10 @@ export interface PDFUploadResponse {
 
 export class ChatAIService {
   static async uploadPDF(file: File): Promise<PDFUploadResponse> {
+    if (file.size > RESUMABLE_UPLOAD_THRESHOLD) {
+      return ChatAIService.uploadPDFResumable(file);
+    }
+
     const formData = new FormData();
     formData.append('file', file);
 
@@ -36,6 +44,61 @@ export class ChatAIService {
     return response.json();
   }
 
+  static async uploadPDFResumable(file: File): Promise<PDFUploadResponse> {
+    const digest = await crypto.subtle.digest('SHA-256', await file.arrayBuffer());
+    const sha256 = Array.from(new Uint8Array(digest))
+      .map(b => b.toString(16).padStart(2, '0'))
+      .join('');
+
+    const createResponse = await fetch(`${API_BASE_URL}/upload/resumable`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ filename: file.name, size: file.size, sha256 }),
+    });
+    if (!createResponse.ok) {
+      throw new Error(`Upload failed: ${createResponse.statusText}`);
+    }
+    const { upload_id: uploadId, part_size: partSize } = await createResponse.json();
+    const uploadUrl = `${API_BASE_URL}/upload/resumable/${uploadId}`;
+
+    let offset = 0;
+    let failures = 0;
+    while (offset < file.size) {
+      try {
+        const response = await fetch(`${uploadUrl}?offset=${offset}`, {
+          method: 'PUT',
+          headers: { 'Content-Type': 'application/octet-stream' },
+          body: file.slice(offset, offset + partSize),
+        });
+        if (!response.ok) {
+          throw new Error(`Upload failed: ${response.statusText}`);
+        }
+        offset = (await response.json()).offset;
+        failures = 0;
+      } catch (error) {
+        if (++failures > MAX_PART_RETRIES) {
+          throw error;
+        }
+        // Resume from whatever the server has actually stored
+        const status = await fetch(uploadUrl).catch(() => null);
+        if (status?.ok) {
+          offset = (await status.json()).offset;
+        }
+      }
+    }
+
+    const finalizeResponse = await fetch(`${uploadUrl}/finalize`, {
+      method: 'POST',
+      headers: { 'Content-Type': 'application/json' },
+      body: JSON.stringify({ sha256 }),
+    });
+    if (!finalizeResponse.ok) {
+      throw new Error(`Upload failed: ${finalizeResponse.statusText}`);
+    }
+
+    return finalizeResponse.json();
+  }
+
   static async sendMessage(request: ChatMessageRequest): Promise<ChatMessageResponse> {
     const response = await fetch(`${API_BASE_URL}/chat`, {
       method: 'POST',
@@ -84,7 +147,8 @@ export class ChatAIService {
 
       const decoder = new TextDecoder();
       let buffer = '';
-      let fullResponse = '';
+      let fullContent = '';
+      let finalEvent: Record<string, unknown> = {};
 
       while (true) {
         const { done, value } = await reader.read();
@@ -99,20 +163,19 @@ export class ChatAIService {
           if (line.startsWith('data: ')) {
             const data = line.slice(6);
             if (data === '[DONE]') {
-              // Stream complete, parse final response
-              try {
-                const finalResponse = JSON.parse(fullResponse);
-                onComplete(finalResponse);
-              } catch (e) {
-                onError(new Error('Failed to parse final response'));
-              }
+              // Stream complete; the final event only carries sources and status,
+              // so the content is what was accumulated from the chunks
+              onComplete({ ...finalEvent, content: fullContent } as unknown as ChatMessageResponse);
               return;
             }
             
             try {
               const parsed = JSON.parse(data);
-              if (parsed.content) {
-                fullResponse = data;
+              if (parsed.done || parsed.success === false) {
+                finalEvent = parsed;
+              }
+              if (!parsed.done && parsed.content) {
+                fullContent += parsed.content;
                 onChunk(parsed.content);
               }
             } catch (e) {
@@ -6,6 +6,7 @@ AI Assistant Backend Startup Script
 import os
 import sys
 import json
+import importlib.util
 from pathlib import Path
 
 def check_keys_file():
@@ -63,9 +64,8 @@ def check_dependencies():
     missing_packages = []
     
     for package in required_packages:
-        try:
-            __import__(package.replace("-", "_"))
-        except ImportError:
+        # Only locate the package; the server imports heavy modules in the background
+        if importlib.util.find_spec(package.replace("-", "_")) is None:
             missing_packages.append(package)
     
     if missing_packages:
@@ -0,0 +1,94 @@
+"""
+Deferred loading of heavy dependencies.
+
+The API server avoids importing langchain, FAISS and torch at module load so it can
+answer liveness probes right away. A background thread imports them and warms up the
+embedding model, recording how long each step took.
+"""
+
+import importlib
+import os
+import threading
+import time
+from typing import Callable, Dict, List, Optional, Tuple
+
+# When the server began importing its own modules; import timings are measured from here
+MODULES_IMPORT_STARTED = time.perf_counter()
+
+
+def _process_start_time() -> float:
+    """Wall-clock time the process was started, from /proc; falls back to this module's import time"""
+    try:
+        with open("/proc/self/stat") as f:
+            # The command name may contain spaces, so split after its closing parenthesis
+            start_ticks = int(f.read().rsplit(")", 1)[1].split()[19])
+        with open("/proc/uptime") as f:
+            uptime = float(f.read().split()[0])
+        return time.time() - (uptime - start_ticks / os.sysconf("SC_CLK_TCK"))
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.time()
+
+
+# Includes interpreter and uvicorn startup, which readiness latency should account for
+PROCESS_STARTED = _process_start_time()
+
+
+def seconds_since_process_start() -> float:
+    return round(time.time() - PROCESS_STARTED, 4)
+
+
+def timed_import(module_name: str, timings: Dict[str, float]):
+    """Import a module and record the time spent (near zero if it was already imported)"""
+    started = time.perf_counter()
+    module = importlib.import_module(module_name)
+    timings[f"import {module_name}"] = round(time.perf_counter() - started, 4)
+    return module
+
+
+class Preloader:
+    """Runs preload steps once in a daemon thread and reports readiness and timings"""
+
+    def __init__(self):
+        self.status = "pending"
+        self.error: Optional[str] = None
+        self.timings: Dict[str, float] = {}
+        self.ready_after: Optional[float] = None
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    @property
+    def is_ready(self) -> bool:
+        return self.status == "ready"
+
+    def start(self, modules: List[str], steps: List[Tuple[str, Callable[[], object]]]):
+        with self._lock:
+            if self._thread is not None:
+                return
+            self.status = "loading"
+            self._thread = threading.Thread(
+                target=self._run, args=(modules, steps), name="model-preload", daemon=True
+            )
+            self._thread.start()
+
+    def _run(self, modules: List[str], steps: List[Tuple[str, Callable[[], object]]]):
+        try:
+            for module_name in modules:
+                timed_import(module_name, self.timings)
+            for name, step in steps:
+                started = time.perf_counter()
+                step()
+                self.timings[name] = round(time.perf_counter() - started, 4)
+            self.status = "ready"
+        except Exception as e:
+            self.error = str(e)
+            self.status = "failed"
+        self.ready_after = seconds_since_process_start()
+
+    def report(self) -> Dict:
+        return {
+            "status": self.status,
+            "error": self.error,
+            "seconds_since_start": seconds_since_process_start(),
+            "ready_after_seconds": self.ready_after,
+            "timings": dict(self.timings),
+        }
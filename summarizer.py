@@ -0,0 +1,98 @@
+"""
+Map-reduce summarization of an ingested PDF.
+
+Sections of the document are summarized in parallel on a caller-provided executor,
+whose size bounds the number of concurrent LLM calls across all documents, and the
+partial summaries are then reduced into a single document summary.
+"""
+
+import re
+from concurrent.futures import Executor
+from typing import Dict, List
+
+SECTION_CHARS = 4000
+REDUCE_BATCH_CHARS = 8000
+MAX_REDUCE_ROUNDS = 3
+
+SUMMARY_REQUEST_PATTERN = re.compile(
+    r"^\s*(please\s+)?((can|could|would) you\s+)?(please\s+)?"
+    r"(summari[sz]e|give( me)? an? (short |brief )?summary|summary)"
+    r"(\s+(of\s+)?(this|the|my)?\s*(pdf|document|doc|file|paper))?"
+    r"(\s+please)?[\s.?!]*$",
+    re.IGNORECASE,
+)
+
+
+def is_summary_request(message: str) -> bool:
+    """Return True if the message asks for a summary of the whole document"""
+    return bool(SUMMARY_REQUEST_PATTERN.match(message))
+
+
+def group_into_sections(texts: List[str], section_chars: int = SECTION_CHARS) -> List[str]:
+    """Join consecutive chunks into sections of at most roughly section_chars characters"""
+    return ["\n".join(batch) for batch in _batch_by_length(texts, section_chars)]
+
+
+def build_section_prompt(section: str, index: int, total: int) -> str:
+    return (
+        "You are summarizing one section of a PDF document.\n"
+        f"This is section {index + 1} of {total}. Summarize its key points concisely, "
+        "keeping names, figures and conclusions. Do not add information that is not in the text.\n\n"
+        f"Section:\n{section}\n\nSummary:"
+    )
+
+
+def build_reduce_prompt(summaries: List[str]) -> str:
+    joined = "\n\n".join(f"Part {i + 1}:\n{s}" for i, s in enumerate(summaries))
+    return (
+        "The following are summaries of consecutive parts of a PDF document.\n"
+        "Combine them into a single coherent summary of the whole document, "
+        "preserving the order of topics and the key points. Do not add information "
+        "that is not in the summaries.\n\n"
+        f"{joined}\n\nDocument summary:"
+    )
+
+
+def _batch_by_length(texts: List[str], max_chars: int) -> List[List[str]]:
+    batches: List[List[str]] = []
+    current: List[str] = []
+    current_len = 0
+    for text in texts:
+        if current and current_len + len(text) > max_chars:
+            batches.append(current)
+            current, current_len = [], 0
+        current.append(text)
+        current_len += len(text)
+    if current:
+        batches.append(current)
+    return batches
+
+
+def summarize_document(llm, texts: List[str], executor: Executor) -> Dict:
+    """
+    Summarize a document given its chunk texts in reading order.
+    LLM calls run on executor; the calling thread only waits for them, so it must not
+    be one of the executor's own workers. Returns the final summary along with the
+    per-section summaries.
+    """
+    sections = group_into_sections(texts)
+    if not sections:
+        return {"summary": "", "section_summaries": []}
+
+    # Map: summarize every section independently
+    prompts = [build_section_prompt(s, i, len(sections)) for i, s in enumerate(sections)]
+    section_summaries = list(executor.map(llm.invoke, prompts))
+
+    if len(section_summaries) == 1:
+        return {"summary": section_summaries[0], "section_summaries": section_summaries}
+
+    # Reduce: collapse partial summaries until they fit into one prompt
+    summaries = section_summaries
+    for _ in range(MAX_REDUCE_ROUNDS):
+        if sum(len(s) for s in summaries) <= REDUCE_BATCH_CHARS:
+            break
+        batches = _batch_by_length(summaries, REDUCE_BATCH_CHARS)
+        summaries = list(executor.map(lambda b: llm.invoke(build_reduce_prompt(b)), batches))
+
+    summary = executor.submit(llm.invoke, build_reduce_prompt(summaries)).result()
+    return {"summary": summary, "section_summaries": section_summaries}